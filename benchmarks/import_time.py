@@ -0,0 +1,51 @@
+"""
+Measures cold import time of feedly_api modules, each in a fresh
+interpreter, and whether importing them loads the HTTP stack.
+
+    python benchmarks/import_time.py [module ...] [--runs N]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROBE = ('import sys, time; t = time.perf_counter(); import {module}; '
+         'print(time.perf_counter() - t, "requests" in sys.modules)')
+
+
+def measure(module: str, runs: int):
+    timings = []
+    loads_requests = False
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c',
+                                 PROBE.format(module=module)],
+                                cwd=ROOT,
+                                check=True,
+                                capture_output=True,
+                                text=True).stdout.split()
+        timings.append(float(output[0]))
+        loads_requests = output[1] == 'True'
+    return timings, loads_requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('modules', nargs='*',
+                        default=['feedly_api',
+                                 'feedly_api.models',
+                                 'feedly_api.streams',
+                                 'requests'])
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+    for module in args.modules:
+        timings, loads_requests = measure(module, args.runs)
+        print(f'{module:<24} median {statistics.median(timings) * 1000:7.2f}ms'
+              f'  min {min(timings) * 1000:7.2f}ms'
+              f'  requests loaded: {loads_requests}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Python bindings for the Feedly API.
+
+Names below are imported from their submodules on first access, so
+``import feedly_api`` stays cheap until the client is actually used.
+"""
+import importlib
+
+
+_exports = {
+    'BaseAPIClient': 'feedly_api.client',
+    'TransferStats': 'feedly_api.client',
+    'Auth': 'feedly_api.models',
+    'FeedlyClient': 'feedly_api.models',
+    'FeedlyCollection': 'feedly_api.models',
+    'PersonalFeedlyCollection': 'feedly_api.models',
+    'EnterpriseFeedlyCollection': 'feedly_api.models',
+    'Feed': 'feedly_api.models',
+    'Entry': 'feedly_api.models',
+    'ContentStream': 'feedly_api.models',
+    'IDStream': 'feedly_api.models',
+    'SearchStream': 'feedly_api.models',
+    'MixStream': 'feedly_api.models',
+    'FeedlyClientPool': 'feedly_api.pool',
+    'Stream': 'feedly_api.streams',
+    'StreamID': 'feedly_api.streams',
+    'StreamOptions': 'feedly_api.streams',
+    'SearchOptions': 'feedly_api.streams',
+    'MixOptions': 'feedly_api.streams',
+    'Projection': 'feedly_api.streams',
+    'Deduplicator': 'feedly_api.dedup',
+    'SeenSet': 'feedly_api.seen',
+    'StreamWatcher': 'feedly_api.watch',
+    'WriteBuffer': 'feedly_api.batch',
+    'Profiler': 'feedly_api.profiling',
+    'export_opml': 'feedly_api.opml',
+    'import_opml': 'feedly_api.opml',
+    'RecordingTransport': 'feedly_api.transport',
+    'ReplayTransport': 'feedly_api.transport',
+}
+
+__all__ = sorted(_exports)
+
+
+def __getattr__(name: str):
+    try:
+        module = _exports[name]
+    except KeyError:
+        raise AttributeError(
+            f"module 'feedly_api' has no attribute '{name}'") from None
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,218 @@
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from requests.exceptions import ConnectionError, Timeout
+
+from feedly_api.exceptions import RateLimitError, APIServerError
+from feedly_api.models import FeedlyClient
+
+
+class WriteBuffer:
+    """
+    Write-behind buffer for entry state changes. Marker and tag
+    operations from any number of threads are collected per action (or
+    tag) and sent as bulk requests once a group reaches :max_batch:
+    entries or has waited :max_delay: seconds. A later opposite operation
+    on the same entry (read vs. unread, tag vs. untag) replaces the
+    pending one. Pending writes are flushed on :close:.
+
+     with WriteBuffer(client) as writes:
+         writes.mark_read(entry_ids)
+         writes.tag('user/.../tag/triaged', entry_ids)
+    """
+    opposites = {'markAsRead': 'keepUnread',
+                 'keepUnread': 'markAsRead',
+                 'markAsSaved': 'markAsUnsaved',
+                 'markAsUnsaved': 'markAsSaved',
+                 'tag': 'untag',
+                 'untag': 'tag'}
+    # untagging puts entry ids in the URL, so keep those batches short
+    url_batch = 50
+    # errors worth retrying; other HTTP errors (400, 401, 403, 404...)
+    # would fail the same way again
+    transient_errors = (RateLimitError, APIServerError,
+                        ConnectionError, Timeout)
+
+    def __init__(self,
+                 client: FeedlyClient,
+                 max_batch: int = 500,
+                 max_delay: float = 5.0,
+                 retries: int = 3,
+                 backoff: float = 1.0):
+        """
+        :param max_batch: entries per bulk request
+        :param max_delay: seconds a write may wait before being flushed
+        :param retries: attempts per batch after the first, on rate
+         limits, server errors and connection errors
+        :param backoff: seconds before the first retry, doubled after
+         each attempt
+        """
+        self._client = client
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.retries = retries
+        self.backoff = backoff
+        self.failed: List[Tuple[Tuple[str, str], List[str], Exception]] = []
+        self._pending: Dict[Tuple[str, str], Dict[str, None]] = {}
+        self._since: Dict[Tuple[str, str], float] = {}
+        self._condition = threading.Condition()
+        self._send_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def mark_read(self, entry_ids: Iterable[str]):
+        self._add('markAsRead', None, entry_ids)
+
+    def mark_unread(self, entry_ids: Iterable[str]):
+        self._add('keepUnread', None, entry_ids)
+
+    def mark_saved(self, entry_ids: Iterable[str]):
+        self._add('markAsSaved', None, entry_ids)
+
+    def mark_unsaved(self, entry_ids: Iterable[str]):
+        self._add('markAsUnsaved', None, entry_ids)
+
+    def tag(self, tag_id: str, entry_ids: Iterable[str]):
+        self._add('tag', tag_id, entry_ids)
+
+    def untag(self, tag_id: str, entry_ids: Iterable[str]):
+        self._add('untag', tag_id, entry_ids)
+
+    def _batch_size(self, action: str) -> int:
+        if action == 'untag':
+            return min(self.max_batch, self.url_batch)
+        return self.max_batch
+
+    def _add(self, action: str, tag_id: str, entry_ids: Iterable[str]):
+        if isinstance(entry_ids, str):
+            entry_ids = [entry_ids]
+        key = (action, tag_id)
+        opposite = (self.opposites[action], tag_id)
+        with self._condition:
+            if self._closed:
+                raise ValueError('WriteBuffer is closed')
+            pending = self._pending.setdefault(key, {})
+            self._since.setdefault(key, time.monotonic())
+            cancelled = self._pending.get(opposite, {})
+            for entry_id in entry_ids:
+                cancelled.pop(entry_id, None)
+                pending[entry_id] = None
+            if len(pending) >= self._batch_size(action):
+                self._condition.notify_all()
+
+    def _due(self, key: Tuple[str, str], now: float) -> bool:
+        return (len(self._pending[key]) >= self._batch_size(key[0])
+                or now - self._since[key] >= self.max_delay)
+
+    def _any_due(self) -> bool:
+        """Whether a batch is due, dropping groups emptied by opposite
+        operations"""
+        now = time.monotonic()
+        due = False
+        for key in list(self._pending):
+            if not self._pending[key]:
+                del self._pending[key]
+                self._since.pop(key, None)
+            elif self._due(key, now):
+                due = True
+        return due
+
+    def _take(self, force: bool = False) -> List[Tuple[Tuple, List[str]]]:
+        """Removes the batches that are due from the pending writes"""
+        now = time.monotonic()
+        batches = []
+        for key in list(self._pending):
+            pending = self._pending[key]
+            size = self._batch_size(key[0])
+            if not pending:
+                del self._pending[key]
+                self._since.pop(key, None)
+                continue
+            if not (force or self._due(key, now)):
+                continue
+            entry_ids = list(pending)
+            for start in range(0, len(entry_ids), size):
+                batches.append((key, entry_ids[start:start + size]))
+            del self._pending[key]
+            del self._since[key]
+        return batches
+
+    def _send(self, key: Tuple[str, str], entry_ids: List[str]):
+        action, tag_id = key
+        for attempt in range(self.retries + 1):
+            try:
+                if action == 'tag':
+                    self._client.tag_entries([tag_id], entry_ids)
+                elif action == 'untag':
+                    self._client.untag_entries([tag_id], entry_ids)
+                else:
+                    self._client.mark_entries(action, entry_ids)
+                return
+            except self.transient_errors as e:
+                if attempt == self.retries:
+                    logging.error(f'giving up on {action} of '
+                                  f'{len(entry_ids)} entries: {e}')
+                    self.failed.append((key, entry_ids, e))
+                    return
+                logging.warning(f'retrying {action} of {len(entry_ids)} '
+                                f'entries: {e}')
+                time.sleep(self.backoff * 2 ** attempt)
+            except Exception as e:
+                logging.error(f'{action} of {len(entry_ids)} entries '
+                              f'failed: {e}')
+                self.failed.append((key, entry_ids, e))
+                return
+
+    def _send_due(self, force: bool = False):
+        # batches are taken and sent under one lock, so a batch taken
+        # later (say by flush) is never sent before one taken earlier
+        with self._send_lock:
+            with self._condition:
+                batches = self._take(force)
+            for key, entry_ids in batches:
+                self._send(key, entry_ids)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._any_due() and not self._closed:
+                    oldest = min(self._since.values(), default=None)
+                    if oldest is None:
+                        self._condition.wait()
+                    else:
+                        self._condition.wait(max(
+                            oldest + self.max_delay - time.monotonic(), 0))
+                closed = self._closed
+            self._send_due()
+            if closed:
+                return
+
+    def flush(self):
+        """Sends every pending write now"""
+        self._send_due(force=True)
+
+    def close(self):
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        self.flush()
+
+    @property
+    def pending(self) -> int:
+        with self._condition:
+            return sum(len(pending) for pending in self._pending.values())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return f'<WriteBuffer {self.pending} pending>'
@@ -0,0 +1,171 @@
+import threading
+import time
+from collections import deque
+from typing import Dict
+
+
+class CircuitBreaker:
+    """
+    Tracks the health of one endpoint family. The circuit opens when the
+    share of failed requests over the last :window: seconds reaches
+    :failure_rate: (once at least :min_requests: were made); requests
+    then fail fast with CircuitOpenError. After :reset_timeout: seconds
+    the circuit half-opens and lets :probes: requests through: a success
+    closes it, a failure opens it again.
+
+    Failures are connection errors, timeouts and 5xx responses. Other
+    HTTP errors (404, 429, ...) show the API is responding, so they count
+    as successes.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self,
+                 family: str,
+                 failure_rate: float = 0.5,
+                 min_requests: int = 10,
+                 window: float = 60.0,
+                 reset_timeout: float = 30.0,
+                 probes: int = 1):
+        self.family = family
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.probes = probes
+        self.state = self.CLOSED
+        self.opened_at = None
+        self._results = deque()  # (timestamp, failed)
+        self._failures = 0
+        self._probing = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_failure(error: Exception) -> bool:
+        status_code = getattr(getattr(error, 'response', None),
+                              'status_code', None)
+        if status_code is not None:
+            return status_code >= 500
+        return isinstance(error, OSError)
+
+    def _trim(self, now: float):
+        while self._results and now - self._results[0][0] > self.window:
+            _, failed = self._results.popleft()
+            self._failures -= failed
+
+    def _open(self, now: float):
+        self.state = self.OPEN
+        self.opened_at = now
+        self._probing = 0
+
+    def before_request(self):
+        """Raises CircuitOpenError unless a request may be sent now"""
+        now = time.monotonic()
+        with self._lock:
+            if self.state == self.OPEN:
+                if now - self.opened_at < self.reset_timeout:
+                    retry_after = self.reset_timeout - (now - self.opened_at)
+                    self._reject(retry_after)
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN:
+                if self._probing >= self.probes:
+                    self._reject(0.0)
+                self._probing += 1
+
+    def _reject(self, retry_after: float):
+        from feedly_api.exceptions import CircuitOpenError
+        raise CircuitOpenError(self.family, retry_after)
+
+    def record_success(self):
+        now = time.monotonic()
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.CLOSED
+                self._probing = 0
+                self._results.clear()
+                self._failures = 0
+            self._results.append((now, False))
+            self._trim(now)
+
+    def record_failure(self):
+        now = time.monotonic()
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._open(now)
+                return
+            self._results.append((now, True))
+            self._failures += 1
+            self._trim(now)
+            if (self.state == self.CLOSED
+                    and len(self._results) >= self.min_requests
+                    and self._failures / len(self._results)
+                    >= self.failure_rate):
+                self._open(now)
+
+    def release(self):
+        """Gives back the probe slot of a request that ended without a
+        result (e.g. interrupted), so the half-open circuit can probe
+        again"""
+        with self._lock:
+            if self.state == self.HALF_OPEN and self._probing > 0:
+                self._probing -= 1
+
+    def record(self, error: Exception = None):
+        if error is not None and self.is_failure(error):
+            self.record_failure()
+        else:
+            self.record_success()
+
+    @property
+    def error_rate(self) -> float:
+        with self._lock:
+            self._trim(time.monotonic())
+            if not self._results:
+                return 0.0
+            return self._failures / len(self._results)
+
+    def __repr__(self):
+        return f'<CircuitBreaker {self.family} {self.state}>'
+
+
+class CircuitBreakers:
+    """One CircuitBreaker per endpoint family (streams, entries,
+    collections, auth, other), created with the same settings"""
+    families = (('/v3/streams', 'streams'),
+                ('/v3/mixes', 'streams'),
+                ('/v3/search', 'streams'),
+                ('/v3/entries', 'entries'),
+                ('/v3/markers', 'entries'),
+                ('/v3/tags', 'entries'),
+                ('/v3/collections', 'collections'),
+                ('/v3/feeds', 'collections'),
+                ('/v3/auth', 'auth'))
+
+    def __init__(self, **settings):
+        """:param settings: keyword arguments for each CircuitBreaker"""
+        self.settings = settings
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def family(cls, endpoint: str) -> str:
+        if endpoint.startswith('/v3/enterprise/'):
+            endpoint = '/v3/' + endpoint[len('/v3/enterprise/'):]
+        for prefix, family in cls.families:
+            if endpoint.startswith(prefix):
+                return family
+        return 'other'
+
+    def get(self, endpoint: str) -> CircuitBreaker:
+        return self[self.family(endpoint)]
+
+    def __getitem__(self, family: str) -> CircuitBreaker:
+        with self._lock:
+            if family not in self.breakers:
+                self.breakers[family] = CircuitBreaker(family,
+                                                       **self.settings)
+            return self.breakers[family]
+
+    def __repr__(self):
+        return f'<CircuitBreakers {list(self.breakers.values())}>'
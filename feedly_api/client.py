@@ -1,24 +1,258 @@
+from __future__ import annotations
+
 import logging
-from typing import Dict, Any
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Union, Iterator, Optional, TYPE_CHECKING
 import re
 
+from feedly_api.deadline import Deadline
+from feedly_api.profiling import Profiler
+
+if TYPE_CHECKING:
+    from requests.models import Response
+
+# requests (and urllib3) are imported on first use rather than here:
+# they dominate import time, and short-lived processes may never make
+# a request
+
+
+class WireCounter:
+    """Wraps the socket file a response body is read from, counting the
+    bytes read through it: the body as received, before de-chunking and
+    content decoding"""
+    def __init__(self, fp):
+        self.fp = fp
+        self.bytes_read = 0
+
+    def _count(self, data):
+        self.bytes_read += len(data)
+        return data
+
+    def read(self, *args):
+        return self._count(self.fp.read(*args))
+
+    def read1(self, *args):
+        return self._count(self.fp.read1(*args))
+
+    def readline(self, *args):
+        return self._count(self.fp.readline(*args))
+
+    def readinto(self, buffer):
+        read = self.fp.readinto(buffer)
+        self.bytes_read += read or 0
+        return read
+
+    def __getattr__(self, name):
+        return getattr(self.fp, name)
+
+
+def count_wire_bytes(response: Response, *args, **kwargs) -> Response:
+    """
+    requests response hook installing a WireCounter under the response
+    before its body is read. urllib3 only counts bytes it reads itself,
+    which leaves chunked bodies (and so most compressed pages) at 0.
+    """
+    original = getattr(response.raw, '_fp', None)  # http.client's
+    fp = getattr(original, 'fp', None)
+    if fp is not None and not isinstance(fp, WireCounter):
+        original.fp = response.wire_counter = WireCounter(fp)
+    return response
+
+
+class TransferRecord:
+    """Bytes received for a single response, before and after decoding"""
+    def __init__(self,
+                 endpoint: str,
+                 content_encoding: str,
+                 compressed_bytes: int,
+                 decompressed_bytes: int):
+        self.endpoint = endpoint
+        self.content_encoding = content_encoding
+        self.compressed_bytes = compressed_bytes
+        self.decompressed_bytes = decompressed_bytes
+
+    @property
+    def ratio(self) -> float:
+        if not self.decompressed_bytes:
+            return 1.0
+        return self.compressed_bytes / self.decompressed_bytes
+
+    def __repr__(self):
+        return (f'<TransferRecord {self.endpoint} '
+                f'{self.compressed_bytes}/{self.decompressed_bytes} bytes '
+                f'({self.content_encoding})>')
+
+
+class TransferStats:
+    """
+    Running totals of bytes received on the wire vs. bytes decoded.
+    Transports whose responses do not come off a socket (such as
+    ReplayTransport) may set ``wire_bytes`` and ``wire_encoding`` on
+    them to report what was originally received.
+    """
+    def __init__(self):
+        self.requests = 0
+        self.compressed_bytes = 0
+        self.decompressed_bytes = 0
+        self.last = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def wire_size(response: Response, decompressed_bytes: int) -> int:
+        if getattr(response, 'wire_bytes', None):
+            return response.wire_bytes
+        counter = getattr(response, 'wire_counter', None)
+        if counter is not None and counter.bytes_read:
+            return counter.bytes_read
+        raw = getattr(response, 'raw', None)
+        try:
+            # urllib3 counts the bytes read off the socket, i.e. before
+            # any gzip/br decoding is applied
+            wire_bytes = raw.tell()
+        except (AttributeError, OSError, ValueError):
+            wire_bytes = 0
+        if wire_bytes:
+            return wire_bytes
+        try:
+            return int(response.headers['Content-Length'])
+        except (KeyError, TypeError, ValueError):
+            return decompressed_bytes
+
+    def record(self,
+               response: Response,
+               endpoint: str,
+               decompressed_bytes: int = None) -> TransferRecord:
+        if decompressed_bytes is None:
+            decompressed_bytes = len(response.content or b'')
+        record = TransferRecord(
+            endpoint,
+            getattr(response, 'wire_encoding', None)
+            or response.headers.get('Content-Encoding', 'identity'),
+            self.wire_size(response, decompressed_bytes),
+            decompressed_bytes)
+        with self._lock:
+            self.requests += 1
+            self.compressed_bytes += record.compressed_bytes
+            self.decompressed_bytes += record.decompressed_bytes
+            self.last = record
+        response.transfer = record
+        return record
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.compressed_bytes = 0
+            self.decompressed_bytes = 0
+            self.last = None
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.decompressed_bytes - self.compressed_bytes
+
+    def __repr__(self):
+        return (f'<TransferStats {self.requests} requests, '
+                f'{self.compressed_bytes}/{self.decompressed_bytes} bytes>')
+
+
+class RateLimit:
+    """
+    Request quota of one token, as last reported by the API's
+    X-RateLimit-Count/Limit/Reset headers. Values are None until a
+    response carrying them is seen, and again once the period resets.
+    """
+    default_reset = 60.0
+
+    def __init__(self):
+        self.count = None
+        self.limit = None
+        self.reset_at = None  # time.monotonic() when the period resets
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _number(headers, name: str):
+        try:
+            return int(float(headers[name]))
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def update(self, headers):
+        count = self._number(headers, 'X-RateLimit-Count')
+        limit = self._number(headers, 'X-RateLimit-Limit')
+        reset = self._number(headers, 'X-RateLimit-Reset')
+        with self._lock:
+            if count is not None:
+                self.count = count
+            if limit is not None:
+                self.limit = limit
+            if reset is not None:
+                self.reset_at = time.monotonic() + reset
 
-from requests import Session
-from requests.models import Response
-from requests.exceptions import HTTPError
+    def exhaust(self, retry_after: float = None):
+        """Marks the quota spent, e.g. after a 429 response"""
+        with self._lock:
+            if retry_after is None:
+                if self.reset_at is not None:
+                    retry_after = self.reset_at - time.monotonic()
+                if not retry_after or retry_after <= 0:
+                    retry_after = self.default_reset
+            self.reset_at = time.monotonic() + retry_after
+            if self.limit is not None:
+                self.count = self.limit
+            else:
+                self.count = self.limit = 0
+
+    def _expire(self):
+        if self.reset_at is not None and time.monotonic() >= self.reset_at:
+            self.count = self.limit = self.reset_at = None
+
+    @property
+    def remaining(self) -> Optional[int]:
+        with self._lock:
+            self._expire()
+            if self.count is None or self.limit is None:
+                return None
+            return max(self.limit - self.count, 0)
+
+    @property
+    def exhausted(self) -> bool:
+        return self.remaining == 0
+
+    @property
+    def resets_in(self) -> float:
+        with self._lock:
+            self._expire()
+            if self.reset_at is None:
+                return 0.0
+            return max(self.reset_at - time.monotonic(), 0.0)
+
+    def __repr__(self):
+        return f'<RateLimit {self.count}/{self.limit}>'
 
 
 class BaseAPIClient:
     """A generic API client"""
     timeout = 10
     retries = 3
+    chunk_size = 64 * 1024
 
     def __init__(self,
                  auth: Any = None,
                  service_host: str = 'localhost',
                  timeout: int = None,
                  retries: int = None,
-                 data_encoding: str = 'application/json'):
+                 data_encoding: str = 'application/json',
+                 compression: Union[bool, str] = True,
+                 transport: Any = None):
+        """
+        :param compression: True to negotiate every content coding the
+         HTTP stack can decode (gzip, deflate and br when brotli is
+         installed), False to ask for uncompressed responses, or an
+         explicit Accept-Encoding value
+        :param transport: object requests are sent through (see
+         feedly_api.transport.Transport); a new requests.Session if None
+        """
         self.auth = auth
         if service_host[-1] == '/':
             service_host = service_host[:-1]
@@ -28,11 +262,54 @@ class BaseAPIClient:
         if retries:
             self.retries = retries
         self.data_encoding = data_encoding
-        self.session = Session()
+        if transport is None:
+            from requests import Session
+            transport = Session()
+        self.session = transport
+        hooks = getattr(transport, 'hooks', None)
+        if hooks is not None and count_wire_bytes not in hooks['response']:
+            hooks['response'].append(count_wire_bytes)
+        self.compression = compression
+        self.session.headers['Accept-Encoding'] = self.accept_encoding
+        self.transfer_stats = TransferStats()
+        self.profiler = None
 
     def __repr__(self):
         return f'<BaseAPIClient on {self.service_host}'
 
+    @property
+    def accept_encoding(self) -> str:
+        if self.compression is True:
+            from urllib3.util.request import ACCEPT_ENCODING
+            return ACCEPT_ENCODING
+        elif not self.compression:
+            return 'identity'
+        return self.compression
+
+    def iter_content(self,
+                     response: Response,
+                     chunk_size: int = None) -> Iterator[bytes]:
+        """Yields decoded chunks of a response requested with
+        ``stream=True``, recording its transfer size once exhausted"""
+        decompressed_bytes = 0
+        for chunk in response.iter_content(chunk_size or self.chunk_size):
+            decompressed_bytes += len(chunk)
+            yield chunk
+        self.transfer_stats.record(response,
+                                   response.request.path_url,
+                                   decompressed_bytes)
+
+    @contextmanager
+    def profile(self, profiler: Profiler = None):
+        """Records per-page timings of this client's streams while the
+        context is active"""
+        previous = self.profiler
+        self.profiler = profiler or Profiler()
+        try:
+            yield self.profiler
+        finally:
+            self.profiler = previous
+
     def close(self):
         self.session.close()
         self.session = None
@@ -61,7 +338,13 @@ class BaseAPIClient:
                     tries: int = 0,
                     timeout: int = None,
                     retries: int = None,
+                    deadline: Deadline = None,
                     **kwargs) -> Response:
+        """
+        :param deadline: overall budget shared by this request and its
+         retries; each attempt's timeout is cut to the time left, and
+         DeadlineExceeded is raised once none is left
+        """
         method = method.upper()
 
         if timeout is None:
@@ -70,6 +353,10 @@ class BaseAPIClient:
         if retries is None:
             retries = self.retries
 
+        if deadline is not None:
+            deadline.check()
+            timeout = min(timeout, deadline.remaining())
+
         if method not in ('GET', 'POST', 'PUT', 'DELETE'):
             raise ValueError(f'Invalid method: {method} '
                              'Please use GET, POST, PUT, or DELETE.')
@@ -77,7 +364,11 @@ class BaseAPIClient:
         response = None
         try:
             if data:
-                headers = {'Content-Type': self.data_encoding}
+                if hasattr(data, 'seek'):
+                    data.seek(0)  # rewind streamed bodies when retrying
+                headers = {'Content-Type': getattr(data,
+                                                   'content_type',
+                                                   self.data_encoding)}
                 response = self.session.request(method,
                                                 self._get_url(endpoint),
                                                 params=params,
@@ -94,6 +385,8 @@ class BaseAPIClient:
         except OSError as e:
             conn_error: Exception = e
         else:
+            if not kwargs.get('stream'):
+                self.transfer_stats.record(response, endpoint)
             return self.handle(response,
                                method,
                                endpoint,
@@ -102,10 +395,12 @@ class BaseAPIClient:
                                tries,
                                timeout,
                                retries,
+                               deadline=deadline,
                                **kwargs)
-        if tries >= retries:
+        if tries >= retries or (deadline is not None and deadline.expired):
             raise conn_error
         else:
+            from requests.exceptions import HTTPError
             try:
                 response.raise_for_status()
             except HTTPError:
@@ -117,6 +412,7 @@ class BaseAPIClient:
                                    tries,
                                    timeout,
                                    retries,
+                                   deadline=deadline,
                                    **kwargs)
             except AttributeError:  # means response is None
                 logging.warning(f'No response received for {endpoint}')
@@ -129,13 +425,14 @@ class BaseAPIClient:
                                         tries=tries + 1,
                                         timeout=timeout,
                                         retries=retries,
+                                        deadline=deadline,
                                         **kwargs)
 
     def get(self,
             endpoint: str,
             params: Dict = None,
-            timeout: int = timeout,
-            retries: int = retries,
+            timeout: int = None,
+            retries: int = None,
             **kwargs) -> Response:
         return self.api_request('GET',
                                 endpoint=endpoint,
@@ -148,8 +445,8 @@ class BaseAPIClient:
              endpoint: str,
              data: Dict = None,
              params: Dict = None,
-             timeout: int = timeout,
-             retries: int = retries,
+             timeout: int = None,
+             retries: int = None,
              **kwargs) -> Response:
         return self.api_request('POST',
                                 endpoint=endpoint,
@@ -163,8 +460,8 @@ class BaseAPIClient:
             endpoint: str,
             data: Dict = None,
             params: Dict = None,
-            timeout: int = timeout,
-            retries: int = retries,
+            timeout: int = None,
+            retries: int = None,
             **kwargs) -> Response:
         return self.api_request('PUT',
                                 endpoint=endpoint,
@@ -178,8 +475,8 @@ class BaseAPIClient:
                endpoint: str,
                data: Dict = None,
                params: Dict = None,
-               timeout: int = timeout,
-               retries: int = retries,
+               timeout: int = None,
+               retries: int = None,
                **kwargs) -> Response:
         return self.api_request('DELETE',
                                 endpoint=endpoint,
@@ -0,0 +1,50 @@
+import threading
+import time
+
+
+class Deadline:
+    """
+    A time budget for an operation made of several requests (e.g. every
+    page of a stream), which another thread can also cancel early.
+    Cancellation is cooperative: it is noticed between requests and
+    between stream items, not in the middle of a request.
+    """
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires = time.monotonic() + seconds
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def remaining(self) -> float:
+        if self.cancelled:
+            return 0.0
+        return max(self.expires - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self):
+        """Raises DeadlineExceeded if no time is left"""
+        if self.expired:
+            from feedly_api.exceptions import DeadlineExceeded
+            raise DeadlineExceeded(self)
+
+    def sleep(self, seconds: float) -> bool:
+        """Sleeps up to :seconds: within the budget; False if the
+        deadline expired or was cancelled in the meantime"""
+        self._cancelled.wait(min(seconds, self.remaining()))
+        return not self.expired
+
+    def __repr__(self):
+        if self.cancelled:
+            state = 'cancelled'
+        else:
+            state = f'{self.remaining():.3f}s left'
+        return f'<Deadline {self.seconds}s ({state})>'
@@ -0,0 +1,214 @@
+import re
+import time
+import threading
+from collections import OrderedDict
+from hashlib import blake2b
+from typing import Any, Dict, List, Tuple
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from feedly_api.streams import Projection
+
+
+def simhash(text: str, bits: int = 64, shingle: int = 1) -> int:
+    """SimHash of the word :shingle:-grams (or words, for shorter texts)
+    of :text:. Similar texts hash to values a small Hamming distance
+    apart."""
+    words = re.findall(r'\w+', text.lower())
+    if shingle > 1 and len(words) >= shingle:
+        features = [' '.join(words[i:i + shingle])
+                    for i in range(len(words) - shingle + 1)]
+    else:
+        features = words
+    weights = [0] * bits
+    for feature in features:
+        digest = blake2b(feature.encode('utf-8'), digest_size=bits // 8)
+        value = int.from_bytes(digest.digest(), 'big')
+        for bit in range(bits):
+            if value >> bit & 1:
+                weights[bit] += 1
+            else:
+                weights[bit] -= 1
+    return sum(1 << bit for bit in range(bits) if weights[bit] > 0)
+
+
+def canonical_url(url: str) -> str:
+    """Normalizes :url: so trivially different links to the same page
+    compare equal (case, 'www.', fragments, tracking parameters, trailing
+    slashes)"""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query)
+                             if not k.lower().startswith('utm_')))
+    path = parts.path.rstrip('/') or '/'
+    return urlunsplit(('https', host, path, query, ''))
+
+
+class _Seen:
+    __slots__ = ('keys', 'signature', 'timestamp')
+
+    def __init__(self, keys: List[Tuple], signature: int, timestamp: float):
+        self.keys = keys
+        self.signature = signature
+        self.timestamp = timestamp
+
+
+class Deduplicator:
+    """
+    Detects entries already seen on any stream it is attached to, by
+    entry id, fingerprint, originId, canonical URL and a SimHash of the
+    title and summary. Memory is bounded by :max_entries: (least recently
+    seen entries are evicted first) and optionally by a time :window:.
+
+    Only the first :max_words: words of title and summary (or content)
+    are hashed, word by word: on summary-length texts, one or two
+    replaced words almost always stay within the default max_distance,
+    while unrelated texts measure 12 or more bits apart.
+
+    Instances are callable, so they can be used as stream filters:
+     stream.add_filter(Deduplicator())
+    """
+    min_words = 8  # texts shorter than this are too short to compare
+    max_words = 64
+    # markup of the body read for max_words words of text
+    max_html_length = 4096
+    _plain_text = Projection(strip_html=True)
+
+    def __init__(self,
+                 max_entries: int = 100000,
+                 window: float = None,
+                 near_duplicates: bool = True,
+                 max_distance: int = 6):
+        """
+        :param max_entries: number of distinct entries to remember
+        :param window: forget entries not seen for this many seconds
+        :param near_duplicates: compare title+summary SimHashes
+        :param max_distance: largest Hamming distance between SimHashes
+         still considered a duplicate
+        """
+        self.max_entries = max_entries
+        self.window = window
+        self.near_duplicates = near_duplicates
+        self.max_distance = max_distance
+        self.duplicates = 0
+        self._entries: Dict[int, _Seen] = OrderedDict()
+        self._keys: Dict[Tuple, int] = {}
+        # pigeonhole: two hashes within max_distance bits of each other
+        # agree exactly on at least one of max_distance + 1 bands
+        self._band_bits = 64 // (max_distance + 1)
+        self._bands: List[Dict[int, set]] = [
+            {} for _ in range(max_distance + 1)]
+        self._next_token = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __call__(self, item: Any) -> bool:
+        """Returns True (and remembers :item:) if it has not been seen"""
+        return not self.check(item)
+
+    @staticmethod
+    def keys(item: Any) -> List[Tuple]:
+        if not isinstance(item, dict):
+            return [('id', item)]
+        keys = []
+        for name in ('id', 'fingerprint', 'originId'):
+            if item.get(name):
+                keys.append((name, item[name]))
+        url = item.get('canonicalUrl')
+        if not url:
+            alternate = item.get('alternate') or [{}]
+            url = alternate[0].get('href')
+        if url:
+            keys.append(('url', canonical_url(url)))
+        return keys
+
+    def signature(self, item: Any) -> int:
+        if not self.near_duplicates or not isinstance(item, dict):
+            return None
+        body = item.get('summary') or item.get('content') or {}
+        html = (body.get('content') or '')[:self.max_html_length]
+        words = ' '.join([item.get('title') or '',
+                          self._plain_text.trim(html)]).split()
+        if len(words) < self.min_words:
+            return None
+        return simhash(' '.join(words[:self.max_words]))
+
+    def _bands_of(self, signature: int):
+        mask = (1 << self._band_bits) - 1
+        for band in range(len(self._bands)):
+            yield band, signature >> (band * self._band_bits) & mask
+
+    def _find(self, keys: List[Tuple], signature: int) -> int:
+        for key in keys:
+            if key in self._keys:
+                return self._keys[key]
+        if signature is None:
+            return None
+        for band, value in self._bands_of(signature):
+            for token in self._bands[band].get(value, ()):
+                distance = bin(self._entries[token].signature
+                               ^ signature).count('1')
+                if distance <= self.max_distance:
+                    return token
+        return None
+
+    def _evict(self, now: float):
+        while self._entries:
+            token, seen = next(iter(self._entries.items()))
+            if (len(self._entries) <= self.max_entries
+                    and (self.window is None
+                         or now - seen.timestamp <= self.window)):
+                break
+            del self._entries[token]
+            for key in seen.keys:
+                if self._keys.get(key) == token:
+                    del self._keys[key]
+            if seen.signature is not None:
+                for band, value in self._bands_of(seen.signature):
+                    tokens = self._bands[band][value]
+                    tokens.discard(token)
+                    if not tokens:
+                        del self._bands[band][value]
+
+    def check(self, item: Any) -> bool:
+        """Returns True if :item: duplicates a remembered entry. Either
+        way, :item: is remembered afterwards."""
+        keys = self.keys(item)
+        signature = self.signature(item)
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            token = self._find(keys, signature)
+            if token is not None:
+                seen = self._entries[token]
+                seen.timestamp = now
+                self._entries.move_to_end(token)
+                for key in keys:
+                    if key not in self._keys:
+                        self._keys[key] = token
+                        seen.keys.append(key)
+                self.duplicates += 1
+                return True
+            token = self._next_token
+            self._next_token += 1
+            self._entries[token] = _Seen(keys, signature, now)
+            for key in keys:
+                self._keys[key] = token
+            if signature is not None:
+                for band, value in self._bands_of(signature):
+                    self._bands[band].setdefault(value, set()).add(token)
+            self._evict(now)
+            return False
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys.clear()
+            for band in self._bands:
+                band.clear()
+
+    def __repr__(self):
+        return f'<Deduplicator {len(self)} entries>'
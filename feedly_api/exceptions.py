@@ -2,7 +2,7 @@ import json
 from datetime import datetime as dt
 
 
-from requests.exceptions import HTTPError
+from requests.exceptions import HTTPError, RequestException, Timeout
 
 
 class FeedlyAPIException(HTTPError):
@@ -63,3 +63,37 @@ class APIServerError(FeedlyAPIException):
     """Raise for status codes >= 500"""
     pass
 
+
+
+class CircuitOpenError(RequestException):
+    """Raise instead of sending a request while the circuit breaker of
+    its endpoint family is open"""
+    def __init__(self, family: str, retry_after: float):
+        self.family = family
+        self.retry_after = retry_after
+        super().__init__(f'Circuit for {family} endpoints is open; '
+                         f'retry in {retry_after:.1f}s')
+
+
+class PoolExhaustedError(RequestException):
+    """Raise when every account of a FeedlyClientPool is rate limited"""
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__('All accounts are rate limited; '
+                         f'retry in {retry_after:.1f}s')
+
+
+class DeadlineExceeded(Exception):
+    """Raise when an operation's Deadline expires or is cancelled
+    before a request could be sent"""
+    def __init__(self, deadline):
+        self.deadline = deadline
+        if deadline.cancelled:
+            super().__init__('Operation cancelled')
+        else:
+            super().__init__(f'Deadline of {deadline.seconds}s exceeded')
+
+
+class CassetteMissError(LookupError):
+    """Raise when a replayed request has no recorded response"""
+    pass
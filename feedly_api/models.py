@@ -1,22 +1,26 @@
-from typing import Dict, Union, Sequence, Callable, List
+from __future__ import annotations
+
+from typing import (Dict, Union, Sequence, Callable, List, Any, Optional,
+                    TYPE_CHECKING)
 import time
 import logging
 import json
+import threading
+import weakref
 
 
-from requests.models import Response
+from feedly_api.client import BaseAPIClient, RateLimit
+from feedly_api.circuit import CircuitBreakers
+from feedly_api.deadline import Deadline
+from feedly_api.utils import (add_kwargs, quote, NoEmpty, MultipartFile,
+                              open_upload, Upload)
+from feedly_api.streams import (Stream, StreamOptions, StreamID,
+                                UserStreamID, EnterpriseStreamID, Projection,
+                                SearchOptions, MixOptions)
 
 
-from feedly_api.client import BaseAPIClient
-from feedly_api.exceptions import (UnauthorizedError,
-                                   BadRequestError,
-                                   NotFoundError,
-                                   RateLimitError,
-                                   APIServerError,
-                                   HTTPError)
-from feedly_api.utils import add_kwargs, quote, NoEmpty
-from feedly_api.streams import (Stream, StreamOptions, StreamID,
-                                UserStreamID, EnterpriseStreamID)
+if TYPE_CHECKING:
+    from requests.models import Response
 
 
 class Auth:
@@ -71,19 +75,79 @@ class Auth:
         return f'<Auth {self.client_id}>'
 
 
+class IdentityMap:
+    """
+    Keeps one FeedlyData object per type and id for a client, so loading
+    a collection or feed again updates the existing object in place
+    instead of creating a duplicate. Objects are held weakly.
+    """
+    def __init__(self):
+        self._objects = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def get(self, data_type: type, object_id: str):
+        return self._objects.get((data_type, object_id))
+
+    def load(self,
+             data_type: type,
+             json_data: Dict,
+             client: 'FeedlyClient',
+             merge: bool = False):
+        """Returns the object for :json_data:'s id, refreshed with
+        :json_data: (merged into its existing data if :merge:)"""
+        object_id = None
+        if isinstance(json_data, dict):
+            object_id = json_data.get('id')
+        if object_id is None:
+            return data_type(json_data, client)
+        with self._lock:
+            data = self._objects.get((data_type, object_id))
+            if data is None:
+                data = data_type(json_data, client)
+                self._objects[(data_type, object_id)] = data
+                return data
+        if merge:
+            json_data = dict(data.json, **json_data)
+        data.json = json_data
+        return data
+
+    def __len__(self):
+        return len(self._objects)
+
+    def clear(self):
+        with self._lock:
+            self._objects.clear()
+
+
+def to_json(items: List) -> List:
+    """Unwraps FeedlyData objects (e.g. Feeds) for request bodies"""
+    return [i.json if isinstance(i, FeedlyData) else i for i in items]
+
+
 class FeedlyClient(BaseAPIClient):
     def __init__(self,
                  auth: Auth,
                  service_host: str,
                  user_id: str = None,
                  timeout: int = None,
-                 retries: int = None):
-        super().__init__(auth, service_host, timeout, retries)
+                 retries: int = None,
+                 compression: Union[bool, str] = True,
+                 transport: Any = None):
+        super().__init__(auth,
+                         service_host,
+                         timeout,
+                         retries,
+                         compression=compression,
+                         transport=transport)
         if self.auth.access_token:
             self.session.headers['Authorization'] = ' '.join(
                 ['Bearer', self.auth.access_token]
             )
         self._user = User(user_id)
+        self.identity_map = IdentityMap()
+        self.rate_limit = RateLimit()
+        # set to None to disable
+        self.circuit_breakers = CircuitBreakers()
 
     @property
     def user(self):
@@ -104,7 +168,16 @@ class FeedlyClient(BaseAPIClient):
                params: Dict,
                tries: int,
                timeout: int,
-               retries: int) -> Response:
+               retries: int,
+               deadline: Deadline = None,
+               **kwargs) -> Response:
+        from feedly_api.exceptions import (UnauthorizedError,
+                                           BadRequestError,
+                                           NotFoundError,
+                                           RateLimitError,
+                                           APIServerError,
+                                           HTTPError)
+        self.rate_limit.update(response.headers)
         try:
             return super().handle(response)
         except HTTPError as e:
@@ -128,11 +201,14 @@ class FeedlyClient(BaseAPIClient):
                                                 params=params,
                                                 tries=tries+1,
                                                 timeout=timeout,
-                                                retries=retries)
+                                                retries=retries,
+                                                deadline=deadline,
+                                                **kwargs)
                 error = UnauthorizedError(e)
             elif code == 404:
                 error = NotFoundError(e)
             elif code == 429:
+                self.rate_limit.exhaust(self._retry_after(response))
                 error = RateLimitError(e)
             elif code >= 500:
                 error = APIServerError(e)
@@ -140,6 +216,16 @@ class FeedlyClient(BaseAPIClient):
                 error = e
         raise error
 
+    @staticmethod
+    def _retry_after(response: Response) -> Optional[float]:
+        try:
+            retry_after = float(response.headers['Retry-After'])
+        except (KeyError, TypeError, ValueError):
+            return None
+        if retry_after > 86400:  # an epoch timestamp rather than seconds
+            retry_after -= time.time()
+        return retry_after if retry_after > 0 else None
+
     def api_request(self,
                     method: str,
                     endpoint: str,
@@ -161,14 +247,48 @@ class FeedlyClient(BaseAPIClient):
 
         if enterprise:
             endpoint = endpoint[:4] + "enterprise/" + endpoint[4:]
-        return super().api_request(method,
-                                   endpoint,
-                                   data,
-                                   params,
-                                   tries,
-                                   timeout,
-                                   retries,
-                                   **kwargs)
+
+        deadline = kwargs.get('deadline')
+        if deadline is not None:
+            deadline.check()
+        # a timeout cut short by the caller's deadline says nothing about
+        # the API's health
+        clipped = (deadline is not None
+                   and deadline.remaining() < (timeout or self.timeout))
+
+        # retries belong to the first attempt's operation, so only that
+        # attempt is checked against and recorded by the circuit breaker
+        breaker = None
+        if self.circuit_breakers is not None and tries == 0:
+            breaker = self.circuit_breakers.get(endpoint)
+            breaker.before_request()
+        outcome = None
+        try:
+            response = super().api_request(method,
+                                           endpoint,
+                                           data,
+                                           params,
+                                           tries,
+                                           timeout,
+                                           retries,
+                                           **kwargs)
+            outcome = True
+            return response
+        except Exception as e:
+            from feedly_api.exceptions import DeadlineExceeded, Timeout
+            if not (isinstance(e, DeadlineExceeded)
+                    or (clipped and isinstance(e, Timeout))):
+                outcome = e
+            raise
+        finally:
+            if breaker is not None:
+                # no result: interrupted, or out of the caller's time
+                if outcome is None:
+                    breaker.release()
+                elif outcome is True:
+                    breaker.record_success()
+                else:
+                    breaker.record(outcome)
 
     def get_auth_code(self, redirect_uri: str, **kwargs) -> Response:
         auth_data = dict(response_type='code',
@@ -222,7 +342,10 @@ class FeedlyClient(BaseAPIClient):
     def get_collection(self, collection_id: str, *, enterprise: bool = False):
         response = self.get(f'/v3/collections/{quote(collection_id)}',
                             enterprise=enterprise)
-        return FeedlyCollection.from_json(response.json(), self, enterprise)
+        collection_data = response.json()
+        if isinstance(collection_data, list):
+            collection_data = collection_data[0]
+        return FeedlyCollection.from_json(collection_data, self, enterprise)
 
     def get_personal_collection(self, collection_id: str):
         return self.get_collection(collection_id, enterprise=False)
@@ -245,6 +368,8 @@ class FeedlyClient(BaseAPIClient):
         change the existing label."""
         if (label is None) and (collection_id is None):
             raise ValueError("Must supply :label: or :collection_id:")
+        if feeds is not None:
+            feeds = to_json(feeds)
         collection_data = NoEmpty(label=label,
                                   id=collection_id,
                                   description=description,
@@ -280,6 +405,45 @@ class FeedlyClient(BaseAPIClient):
                                                 delete_cover,
                                                 enterprise=True)
 
+    def update_collection_cover(self,
+                                collection_id: str,
+                                cover: Upload,
+                                content_type: str = None,
+                                enterprise: bool = False):
+        """Uploads :cover: (a path, bytes or binary file object) as the
+        collection's cover image. Files are streamed, not read into
+        memory; files opened from a path are closed afterwards."""
+        cover_file, opened = open_upload(cover)
+        try:
+            body = MultipartFile(cover_file, 'file', content_type=content_type)
+            return self.post(f'/v3/collections/{quote(collection_id)}',
+                             data=body,
+                             enterprise=enterprise)
+        finally:
+            if opened:
+                cover_file.close()
+
+    def update_collection_covers(self,
+                                 covers: Dict[str, Upload],
+                                 enterprise: bool = False,
+                                 max_workers: int = 8) -> Dict:
+        """Uploads covers for many collections concurrently. :covers:
+        maps collection ids to covers; returns a dict mapping each id to
+        its response, or to the exception its upload raised."""
+        def upload(collection_id):
+            try:
+                return self.update_collection_cover(collection_id,
+                                                    covers[collection_id],
+                                                    enterprise=enterprise)
+            except Exception as e:
+                logging.warning(f'error updating cover of {collection_id}',
+                                exc_info=e)
+                return e
+
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return dict(zip(covers, executor.map(upload, covers)))
+
     def add_feed_collection(self,
                             collection_id: str,
                             feed_id: str,
@@ -313,7 +477,7 @@ class FeedlyClient(BaseAPIClient):
                              feeds: List[Dict],
                              enterprise: bool = False):
         return self.put(f'/v3/collections/{quote(collection_id)}/feeds/.mput',
-                        data=json.dumps(feeds),
+                        data=json.dumps(to_json(feeds)),
                         enterprise=enterprise)
 
     def add_feeds_personal_collection(self,
@@ -365,7 +529,7 @@ class FeedlyClient(BaseAPIClient):
                                 enterprise: bool = False):
         orphan_data = NoEmpty(keepOrphanFeeds=keep_orphans)
         return self.delete(f'/v3/collections/{quote(collection_id)}/feeds/.mdelete',
-                           data=json.dumps(feeds),
+                           data=json.dumps(to_json(feeds)),
                            params=orphan_data,
                            enterprise=enterprise)
 
@@ -387,6 +551,15 @@ class FeedlyClient(BaseAPIClient):
                                             keep_orphans,
                                             enterprise=True)
 
+    def get_feed(self, feed_id: str):
+        response = self.get(f'/v3/feeds/{quote(feed_id)}')
+        return self.identity_map.load(Feed, response.json(), self, merge=True)
+
+    def get_feeds(self, feed_ids: List[str]):
+        response = self.post('/v3/feeds/.mget', data=json.dumps(feed_ids))
+        return [self.identity_map.load(Feed, data, self, merge=True)
+                for data in response.json()]
+
     def get_entry(self, entry_id: str):
         return Entry(self.get(f'/v3/entries/{entry_id}').json(), self)
 
@@ -413,14 +586,70 @@ class FeedlyClient(BaseAPIClient):
                              updated=updated)
         return self.post('/v3/entries', data=entry_data)
 
+    def mark_entries(self, action: str, entry_ids: List[str]):
+        """Applies a marker :action: ('markAsRead', 'keepUnread',
+        'markAsSaved' or 'markAsUnsaved') to every entry in :entry_ids:"""
+        marker_data = dict(action=action, type='entries', entryIds=entry_ids)
+        return self.post('/v3/markers', data=json.dumps(marker_data))
+
+    def mark_entries_read(self, entry_ids: List[str]):
+        return self.mark_entries('markAsRead', entry_ids)
+
+    def mark_entries_unread(self, entry_ids: List[str]):
+        return self.mark_entries('keepUnread', entry_ids)
+
+    def mark_entries_saved(self, entry_ids: List[str]):
+        return self.mark_entries('markAsSaved', entry_ids)
+
+    def mark_entries_unsaved(self, entry_ids: List[str]):
+        return self.mark_entries('markAsUnsaved', entry_ids)
+
+    def tag_entries(self, tag_ids: List[str], entry_ids: List[str]):
+        tags = ','.join(quote(tag_id) for tag_id in tag_ids)
+        return self.put(f'/v3/tags/{tags}',
+                        data=json.dumps(dict(entryIds=entry_ids)))
+
+    def untag_entries(self, tag_ids: List[str], entry_ids: List[str]):
+        tags = ','.join(quote(tag_id) for tag_id in tag_ids)
+        entries = ','.join(quote(entry_id) for entry_id in entry_ids)
+        return self.delete(f'/v3/tags/{tags}/{entries}')
+
     def get_stream_contents(self,
                             stream_id: str,
                             stream_type: str,
-                            options: StreamOptions):
+                            options: StreamOptions,
+                            continuation: str = None,
+                            count: int = None,
+                            deadline: Deadline = None):
         response = self.get(f'/v3/streams/{quote(stream_id)}/{stream_type}',
-                            params=options.get_options())
+                            params=options.get_options(continuation, count),
+                            deadline=deadline)
         return response
 
+    def search_contents(self,
+                        stream_id: str,
+                        options: SearchOptions,
+                        continuation: str = None,
+                        count: int = None,
+                        deadline: Deadline = None):
+        params = options.get_options(continuation, count)
+        params['streamId'] = stream_id
+        return self.get('/v3/search/contents',
+                        params=params,
+                        deadline=deadline)
+
+    def get_mix_contents(self,
+                         stream_id: str,
+                         options: MixOptions,
+                         continuation: str = None,
+                         count: int = None,
+                         deadline: Deadline = None):
+        params = options.get_options(continuation, count)
+        params['streamId'] = stream_id
+        return self.get('/v3/mixes/contents',
+                        params=params,
+                        deadline=deadline)
+
 
 class FeedlyData:
     def __init__(self,
@@ -433,6 +662,10 @@ class FeedlyData:
         # sub classes should clear any cached items here
         pass
 
+    @property
+    def id(self) -> str:
+        return self['id']
+
     @property
     def json(self):
         return self._json
@@ -444,6 +677,11 @@ class FeedlyData:
 
     def __getitem__(self, name):
         return self.json.get(name)
+
+    def get(self, name, default=None):
+        """dict.get, for code written against the raw json"""
+        self[name]  # lets subclasses load missing fields
+        return self.json.get(name, default)
     '''
     def __getattribute__(self, item):
         try:
@@ -462,13 +700,15 @@ class ContentStream(Stream):
     def __init__(self,
                  client: BaseAPIClient,
                  stream_id: Union[StreamID, str],
-                 options: StreamOptions):
+                 options: StreamOptions,
+                 projection: Projection = None):
         super().__init__(client,
                          stream_id,
                          options,
                          'contents',
                          'items',
-                         lambda x: x)
+                         lambda x: x,
+                         projection)
 
 
 class IDStream(Stream):
@@ -484,6 +724,57 @@ class IDStream(Stream):
                          lambda x: x)
 
 
+class SearchStream(Stream):
+    """Iterates the items of a stream matching a search query"""
+    def __init__(self,
+                 client: BaseAPIClient,
+                 stream_id: Union[StreamID, str],
+                 options: SearchOptions,
+                 projection: Projection = None):
+        super().__init__(client,
+                         stream_id,
+                         options,
+                         'contents',
+                         'items',
+                         lambda x: x,
+                         projection)
+
+    def request_page(self, count: int):
+        return self._client.search_contents(str(self.stream_id),
+                                            self.options,
+                                            continuation=self.continuation,
+                                            count=count,
+                                            deadline=self.deadline)
+
+
+class MixStream(Stream):
+    """Iterates the most engaging recent items of a stream"""
+    def __init__(self,
+                 client: BaseAPIClient,
+                 stream_id: Union[StreamID, str],
+                 options: MixOptions,
+                 projection: Projection = None):
+        super().__init__(client,
+                         stream_id,
+                         options,
+                         'contents',
+                         'items',
+                         lambda x: x,
+                         projection)
+
+    def page_size(self) -> int:
+        # the one page is all there is, so buffer limits must not shrink
+        # it
+        return self.options.count
+
+    def request_page(self, count: int):
+        return self._client.get_mix_contents(str(self.stream_id),
+                                             self.options,
+                                             continuation=self.continuation,
+                                             count=count,
+                                             deadline=self.deadline)
+
+
 class Streamable(FeedlyData):
     def stream(self,
                stream_type: Callable[
@@ -503,9 +794,22 @@ class Streamable(FeedlyData):
     def stream_contents(self, options: StreamOptions = None):
         return self.stream(ContentStream, options)
 
+    def search(self, query: str, options: SearchOptions = None):
+        """:param options: search options; their query is replaced
+        by :query:"""
+        if options is None:
+            options = SearchOptions(query)
+        else:
+            options = options.replace(query=query)
+        return self.stream(SearchStream, options)
+
+    def mixes(self, options: MixOptions = None):
+        return self.stream(MixStream, options or MixOptions())
+
 
 class FeedlyCollection(Streamable):
     enterprise = False
+    _feeds = None
 
     @classmethod
     def from_json(cls,
@@ -513,9 +817,21 @@ class FeedlyCollection(Streamable):
                   client: FeedlyClient,
                   enterprise: bool = False):
         if enterprise:
-            return EnterpriseFeedlyCollection(json_data, client)
+            collection_type = EnterpriseFeedlyCollection
         else:
-            return PersonalFeedlyCollection(json_data, client)
+            collection_type = PersonalFeedlyCollection
+        return client.identity_map.load(collection_type, json_data, client)
+
+    def _onchange(self):
+        self._feeds = None
+
+    def _get_id(self) -> str:
+        return self.id
+
+    def refresh(self):
+        """Reloads this collection in place"""
+        return self._client.get_collection(self._get_id(),
+                                           enterprise=self.enterprise)
 
     @property
     def label(self) -> str:
@@ -534,8 +850,24 @@ class FeedlyCollection(Streamable):
         return self['created']
 
     @property
-    def feeds(self) -> List:
-        return self['feeds']
+    def feeds(self) -> List['Feed']:
+        if self._feeds is None:
+            self._feeds = [self._client.identity_map.load(Feed,
+                                                          feed,
+                                                          self._client,
+                                                          merge=True)
+                           for feed in self['feeds'] or []]
+        return self._feeds
+
+    def load_feeds(self) -> List['Feed']:
+        """Fetches full details of all feeds not loaded yet in a single
+        request"""
+        unloaded = [feed for feed in self.feeds if not feed.loaded]
+        if unloaded:
+            self._client.get_feeds([feed.id for feed in unloaded])
+            for feed in unloaded:
+                feed.loaded = True
+        return self.feeds
 
     def update_collection(self,
                           label: str = None,
@@ -552,18 +884,12 @@ class FeedlyCollection(Streamable):
         )
 
     def update_cover(self,
-                     cover_file: str):
-        file_data = {'file': open(cover_file, 'rb')}
-        if self.enterprise:
-            return self._client.post(
-                f'/v3/enterprise/collections/{self._get_id()}',
-                files=file_data
-            )
-        else:
-            return self._client.post(
-                f'/v3/collections/{self._get_id()}',
-                files=file_data
-            )
+                     cover: Upload,
+                     content_type: str = None):
+        return self._client.update_collection_cover(self._get_id(),
+                                                    cover,
+                                                    content_type,
+                                                    enterprise=self.enterprise)
 
     def add_feed(self, feed_id: str, feed_title: str):
         return self._client.add_feed_collection(self._get_id(),
@@ -597,6 +923,68 @@ class EnterpriseFeedlyCollection(FeedlyCollection):
     enterprise = True
 
 
+class Feed(Streamable):
+    """
+    A feed, usually known first from the summary embedded in a
+    collection. Fields missing from that summary are fetched from the
+    feeds endpoint the first time one is read. If that fails (e.g. for
+    a dead feed), missing fields read as None and the fetch is not
+    tried again for :retry_delay: seconds.
+    """
+    retry_delay = 300.0
+
+    def __init__(self,
+                 json_data: Dict,
+                 client: FeedlyClient):
+        super().__init__(json_data, client)
+        self.loaded = False
+        self.load_error = None
+        self._failed_at = None
+
+    def __getitem__(self, name):
+        if (name not in self.json and not self.loaded
+                and (self._failed_at is None
+                     or time.monotonic() - self._failed_at
+                     >= self.retry_delay)):
+            from requests.exceptions import RequestException
+            try:
+                self.load()
+            except RequestException as e:
+                logging.warning(f'could not load feed {self.id}: {e}')
+                self.load_error = e
+                self._failed_at = time.monotonic()
+        return super().__getitem__(name)
+
+    def load(self):
+        """Fetches the feed's full details"""
+        feed = self._client.get_feed(self.id)
+        if feed is not self:  # not tracked by the client's identity map
+            self.json = dict(self.json, **feed.json)
+        self.loaded = True
+        self.load_error = self._failed_at = None
+        return self
+
+    @property
+    def title(self) -> str:
+        return self['title']
+
+    @property
+    def website(self) -> str:
+        return self['website']
+
+    @property
+    def subscribers(self) -> int:
+        return self['subscribers']
+
+    @property
+    def velocity(self) -> float:
+        return self['velocity']
+
+    @property
+    def updated(self) -> int:
+        return self['updated']
+
+
 class Entry(FeedlyData):
     def _update(self):
         self._json = self._client.get(f'/v3/entries/{self.id}')
@@ -0,0 +1,149 @@
+from typing import BinaryIO, Dict, Iterable, List, Union
+from xml.etree.ElementTree import iterparse
+from xml.sax.saxutils import XMLGenerator
+
+from feedly_api.models import FeedlyClient, FeedlyCollection
+
+
+def _outline(feed: Dict) -> Dict[str, str]:
+    feed_id = feed.get('id') or feed.get('feedId') or ''
+    title = feed.get('title') or feed_id
+    attributes = dict(type='rss',
+                      text=title,
+                      title=title,
+                      xmlUrl=feed_id[len('feed/'):]
+                      if feed_id.startswith('feed/') else feed_id)
+    if feed.get('website'):
+        attributes['htmlUrl'] = feed['website']
+    return attributes
+
+
+def export_opml(client: FeedlyClient,
+                destination: Union[str, BinaryIO],
+                collections: Iterable[FeedlyCollection] = None,
+                enterprise: bool = False,
+                title: str = 'Feedly collections') -> int:
+    """
+    Writes collections and their feeds to :destination: (a path or a
+    binary file object) as OPML, one category outline per collection.
+    The document is written as it is generated, never built in memory.
+    Returns the number of feeds written.
+
+    :param collections: collections to export; all of the user's (or
+     the enterprise's) collections if None
+    """
+    if collections is None:
+        collections = client.get_collections(enterprise=enterprise)
+    if isinstance(destination, str):
+        with open(destination, 'wb') as output:
+            return export_opml(client, output, collections, enterprise,
+                               title)
+
+    xml = XMLGenerator(destination, encoding='utf-8',
+                       short_empty_elements=True)
+    xml.startDocument()
+    xml.startElement('opml', dict(version='2.0'))
+    xml.startElement('head', {})
+    xml.startElement('title', {})
+    xml.characters(title)
+    xml.endElement('title')
+    xml.endElement('head')
+    xml.startElement('body', {})
+    written = 0
+    for collection in collections:
+        label = collection.label or collection.id
+        xml.ignorableWhitespace('\n')
+        xml.startElement('outline', dict(text=label, title=label))
+        # raw feed json: exporting should not fill the identity map
+        for feed in collection['feeds'] or []:
+            xml.ignorableWhitespace('\n')
+            xml.startElement('outline', _outline(feed))
+            xml.endElement('outline')
+            written += 1
+        xml.endElement('outline')
+    xml.ignorableWhitespace('\n')
+    xml.endElement('body')
+    xml.endElement('opml')
+    xml.endDocument()
+    return written
+
+
+def _collection_id(response_data: Union[Dict, List]) -> str:
+    if isinstance(response_data, list):
+        response_data = response_data[0]
+    return response_data['id']
+
+
+def import_opml(client: FeedlyClient,
+                source: Union[str, BinaryIO],
+                enterprise: bool = False,
+                batch_size: int = 500,
+                default_label: str = 'Imported') -> Dict[str, int]:
+    """
+    Adds the feeds of an OPML file (a path or a binary file object) to
+    collections named after their category outlines, creating missing
+    collections. Feeds outside any category go to :default_label:.
+
+    The file is parsed incrementally and each finished outline is
+    discarded, and feeds are sent in .mput batches of :batch_size:, so
+    memory stays bounded by the batches pending per category rather
+    than the size of the file. Returns the number of feeds added per
+    collection label.
+    """
+    collection_ids = {collection.label: collection.id
+                      for collection in client.get_collections(
+                          enterprise=enterprise)}
+    pending: Dict[str, List[Dict]] = {}
+    added: Dict[str, int] = {}
+
+    def flush(label: str):
+        feeds = pending.pop(label, None)
+        if not feeds:
+            return
+        if label in collection_ids:
+            client.add_feeds_collection(collection_ids[label],
+                                        feeds,
+                                        enterprise=enterprise)
+        else:
+            # the first batch goes with the request creating it
+            response = client.create_or_update_collection(
+                label=label, feeds=feeds, enterprise=enterprise)
+            collection_ids[label] = _collection_id(response.json())
+        added[label] = added.get(label, 0) + len(feeds)
+
+    labels: List[str] = []
+    elements = []
+    for event, element in iterparse(source, events=('start', 'end')):
+        if element.tag != 'outline':
+            if event == 'start':
+                elements.append(element)
+            else:
+                elements.pop()
+            continue
+        url = element.get('xmlUrl')
+        if event == 'start':
+            elements.append(element)
+            if not url:
+                labels.append(element.get('title')
+                              or element.get('text')
+                              or default_label)
+            continue
+        elements.pop()
+        if url:
+            label = labels[-1] if labels else default_label
+            feed = dict(id=url if url.startswith('feed/') else f'feed/{url}')
+            title = element.get('title') or element.get('text')
+            if title:
+                feed['title'] = title
+            pending.setdefault(label, []).append(feed)
+            if len(pending[label]) >= batch_size:
+                flush(label)
+        else:
+            flush(labels.pop())
+        # drop the parsed outline so the tree never grows
+        element.clear()
+        if elements:
+            elements[-1].remove(element)
+    for label in list(pending):
+        flush(label)
+    return added
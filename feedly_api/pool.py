@@ -0,0 +1,345 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import (Callable, Dict, Iterable, List, Union,
+                    TYPE_CHECKING)
+
+from feedly_api.deadline import Deadline
+from feedly_api.models import (Auth, FeedlyClient, ContentStream, IDStream,
+                               SearchStream, MixStream)
+from feedly_api.profiling import Profiler
+from feedly_api.streams import (StreamID, StreamOptions, SearchOptions,
+                                MixOptions)
+
+if TYPE_CHECKING:
+    from requests.exceptions import HTTPError
+    from requests.models import Response
+
+
+class Account:
+    """One client of a FeedlyClientPool and the requests it has in flight"""
+    def __init__(self, client: FeedlyClient):
+        self.client = client
+        self.in_flight = 0
+
+    @property
+    def rate_limit(self):
+        return self.client.rate_limit
+
+    def __repr__(self):
+        return (f'<Account {self.in_flight} in flight, '
+                f'{self.rate_limit.remaining} requests left>')
+
+
+class FeedlyClientPool:
+    """
+    Spreads requests over several accounts (e.g. enterprise service
+    accounts) to combine their rate limits:
+     pool = FeedlyClientPool([auth1, auth2, auth3], 'cloud.feedly.com')
+     for entry in pool.stream_contents(stream_id): ...
+
+    Each request goes to the available account with the fewest requests
+    in flight (strategy='least_loaded') or the most quota left
+    (strategy='remaining_quota'), skipping accounts whose quota is
+    spent; a rate limited request moves on to the next account.
+
+    Streams are pinned to the first account that reads them
+    successfully, so pages keep coming from the same account. Accounts
+    answering 401, 403 or 404 for a stream are not asked for it again;
+    once the others are rate limited as well, that error is raised.
+    Pins and denials are kept for the :max_streams: most recently read
+    streams.
+    The pool can stand in for a client wherever only stream contents,
+    searches or mixes are read (Stream and its subclasses,
+    StreamWatcher).
+
+    Writes that change one user's state (read markers, tags, ...)
+    should be made through that account's own client instead.
+    """
+    strategies = ('least_loaded', 'remaining_quota')
+    denied_status_codes = (401, 403, 404)
+
+    def __init__(self,
+                 accounts: Iterable[Union[Auth, FeedlyClient]],
+                 service_host: str = None,
+                 strategy: str = 'least_loaded',
+                 max_streams: int = 10000,
+                 **client_kwargs):
+        """
+        :param accounts: Auths to create clients for, or clients
+        :param max_streams: number of streams whose pinned account and
+         denials are remembered
+        :param client_kwargs: keyword arguments for each new FeedlyClient;
+         a transport must not be shared, as it carries the token
+        """
+        if strategy not in self.strategies:
+            raise ValueError(f'Invalid strategy: {strategy} '
+                             f'Please use one of {self.strategies}.')
+        self.strategy = strategy
+        self.accounts: List[Account] = []
+        for account in accounts:
+            if not isinstance(account, FeedlyClient):
+                account = FeedlyClient(account,
+                                       service_host,
+                                       **client_kwargs)
+            self.accounts.append(Account(account))
+        if not self.accounts:
+            raise ValueError('A client pool needs at least one account')
+        self.max_streams = max_streams
+        self.pins: Dict[str, Account] = OrderedDict()
+        # stream id -> {id(account): error it answered with}
+        self._denied: Dict[str, Dict[int, HTTPError]] = OrderedDict()
+        self.profiler = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return (f'<FeedlyClientPool {len(self.accounts)} accounts, '
+                f'{self.strategy}>')
+
+    def __len__(self):
+        return len(self.accounts)
+
+    def _rank(self, account: Account):
+        remaining = account.rate_limit.remaining
+        if remaining is None:  # unknown until the account is used
+            remaining = float('inf')
+        if self.strategy == 'remaining_quota':
+            return -remaining, account.in_flight
+        return account.in_flight, -remaining
+
+    def _pick(self, exclude: Iterable[Account]) -> Account:
+        excluded = set(map(id, exclude))
+        candidates = [account for account in self.accounts
+                      if id(account) not in excluded]
+        available = [account for account in candidates
+                     if not account.rate_limit.exhausted]
+        if not available:
+            from feedly_api.exceptions import PoolExhaustedError
+            raise PoolExhaustedError(
+                min((account.rate_limit.resets_in
+                     for account in candidates), default=0.0))
+        return min(available, key=self._rank)
+
+    def choose(self, exclude: Iterable[Account] = ()) -> Account:
+        """Returns the best available account not in :exclude:, raising
+        PoolExhaustedError when every account's quota is spent"""
+        with self._lock:
+            return self._pick(exclude)
+
+    def _acquire(self,
+                 exclude: List[Account] = (),
+                 stream_id: str = None) -> Account:
+        # choosing and counting the request in one step, so concurrent
+        # callers see each other's load
+        with self._lock:
+            if stream_id is None:
+                account = self._pick(exclude)
+            else:
+                account = self._stream_account(stream_id, exclude)
+            account.in_flight += 1
+            return account
+
+    def _release(self, account: Account):
+        with self._lock:
+            account.in_flight -= 1
+
+    @contextmanager
+    def _use(self, exclude: List[Account] = ()):
+        account = self._acquire(exclude)
+        try:
+            yield account
+        finally:
+            self._release(account)
+
+    @contextmanager
+    def client(self) -> FeedlyClient:
+        """Lends out the best available client for several requests"""
+        with self._use() as account:
+            yield account.client
+
+    def api_request(self,
+                    method: str,
+                    endpoint: str,
+                    **kwargs) -> Response:
+        from feedly_api.exceptions import RateLimitError
+        tried = []
+        while True:
+            with self._use(tried) as account:
+                try:
+                    return account.client.api_request(method,
+                                                      endpoint,
+                                                      **kwargs)
+                except RateLimitError:
+                    tried.append(account)
+                    if len(tried) == len(self.accounts):
+                        raise
+
+    def get(self, endpoint: str, **kwargs) -> Response:
+        return self.api_request('GET', endpoint, **kwargs)
+
+    def post(self, endpoint: str, **kwargs) -> Response:
+        return self.api_request('POST', endpoint, **kwargs)
+
+    def put(self, endpoint: str, **kwargs) -> Response:
+        return self.api_request('PUT', endpoint, **kwargs)
+
+    def delete(self, endpoint: str, **kwargs) -> Response:
+        return self.api_request('DELETE', endpoint, **kwargs)
+
+    def _remember(self, streams: Dict, stream_id: str, value):
+        streams[stream_id] = value
+        streams.move_to_end(stream_id)
+        while len(streams) > self.max_streams:
+            streams.popitem(last=False)
+
+    def _stream_account(self, stream_id: str, tried: List[Account]):
+        # called with the lock held
+        denied = self._denied.get(stream_id, {})
+        exclude = list(tried) + [account for account in self.accounts
+                                 if id(account) in denied]
+        pinned = self.pins.get(stream_id)
+        if (pinned is not None and pinned not in exclude
+                and not pinned.rate_limit.exhausted):
+            self.pins.move_to_end(stream_id)
+            return pinned
+        from feedly_api.exceptions import PoolExhaustedError
+        try:
+            return self._pick(exclude)
+        except PoolExhaustedError:
+            if denied:
+                # the accounts left are only rate limited; what the
+                # others answered is the better explanation
+                raise list(denied.values())[-1]
+            raise
+
+    def get_stream_contents(self,
+                            stream_id: str,
+                            stream_type: str,
+                            options: StreamOptions,
+                            continuation: str = None,
+                            count: int = None,
+                            deadline: Deadline = None):
+        return self._read_stream(
+            stream_id,
+            lambda client: client.get_stream_contents(stream_id,
+                                                      stream_type,
+                                                      options,
+                                                      continuation,
+                                                      count,
+                                                      deadline))
+
+    def search_contents(self,
+                        stream_id: str,
+                        options: SearchOptions,
+                        continuation: str = None,
+                        count: int = None,
+                        deadline: Deadline = None):
+        return self._read_stream(
+            stream_id,
+            lambda client: client.search_contents(stream_id,
+                                                  options,
+                                                  continuation,
+                                                  count,
+                                                  deadline))
+
+    def get_mix_contents(self,
+                         stream_id: str,
+                         options: MixOptions,
+                         continuation: str = None,
+                         count: int = None,
+                         deadline: Deadline = None):
+        return self._read_stream(
+            stream_id,
+            lambda client: client.get_mix_contents(stream_id,
+                                                   options,
+                                                   continuation,
+                                                   count,
+                                                   deadline))
+
+    def _read_stream(self,
+                     stream_id: str,
+                     read: Callable[[FeedlyClient], Response]) -> Response:
+        from feedly_api.exceptions import HTTPError, RateLimitError
+        tried = []
+        denied_here = False
+        while True:
+            account = self._acquire(tried, stream_id)
+            try:
+                response = read(account.client)
+            except RateLimitError:
+                tried.append(account)
+                if len(tried) == len(self.accounts) and not denied_here:
+                    raise
+                continue
+            except HTTPError as e:
+                status_code = getattr(e.response, 'status_code', None)
+                if status_code not in self.denied_status_codes:
+                    raise
+                tried.append(account)
+                denied_here = True
+                with self._lock:
+                    denied = self._denied.get(stream_id, {})
+                    denied[id(account)] = e
+                    self._remember(self._denied, stream_id, denied)
+                    if self.pins.get(stream_id) is account:
+                        del self.pins[stream_id]
+                    if len(denied) == len(self.accounts):
+                        # no account can read it; probe them all again
+                        # next time, in case access is granted later
+                        del self._denied[stream_id]
+                        raise
+                continue
+            finally:
+                self._release(account)
+            with self._lock:
+                if stream_id not in self.pins:
+                    self._remember(self.pins, stream_id, account)
+            return response
+
+    def stream_contents(self,
+                        stream_id: Union[StreamID, str],
+                        options: StreamOptions = None) -> ContentStream:
+        return ContentStream(self, stream_id, options or StreamOptions())
+
+    def stream_ids(self,
+                   stream_id: Union[StreamID, str],
+                   options: StreamOptions = None) -> IDStream:
+        return IDStream(self, stream_id, options or StreamOptions())
+
+    def search(self,
+               stream_id: Union[StreamID, str],
+               query: str,
+               options: SearchOptions = None) -> SearchStream:
+        if options is None:
+            options = SearchOptions(query)
+        else:
+            options = options.replace(query=query)
+        return SearchStream(self, stream_id, options)
+
+    def mixes(self,
+              stream_id: Union[StreamID, str],
+              options: MixOptions = None) -> MixStream:
+        return MixStream(self, stream_id, options or MixOptions())
+
+    @contextmanager
+    def profile(self, profiler: Profiler = None):
+        """Records per-page timings of the pool's streams while the
+        context is active"""
+        previous = self.profiler
+        self.profiler = profiler or Profiler()
+        try:
+            yield self.profiler
+        finally:
+            self.profiler = previous
+
+    def close(self):
+        for account in self.accounts:
+            account.client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
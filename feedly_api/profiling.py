@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+
+class Span:
+    """One timed phase of one stream page"""
+    __slots__ = ('phase', 'stream', 'start', 'duration', 'thread', 'args')
+
+    def __init__(self,
+                 phase: str,
+                 stream: str,
+                 start: float,
+                 duration: float,
+                 thread: int,
+                 args: Dict):
+        self.phase = phase
+        self.stream = stream
+        self.start = start
+        self.duration = duration
+        self.thread = thread
+        self.args = args
+
+    def __repr__(self):
+        return f'<Span {self.phase} {self.stream} {self.duration:.6f}s>'
+
+
+class Profiler:
+    """
+    Collects per-page timings from streams whose client is profiled:
+     with client.profile() as profiler:
+         for entry in stream: ...
+     print(profiler.format_summary())
+     profiler.dump_chrome_trace('stream.trace.json')
+
+    Phases recorded for each page:
+     request  - HTTP round trip, body included (args: ttfb, bytes)
+     decode   - JSON decoding, projection and filters
+     buffer   - moving decoded items into the stream buffer
+     wait     - time the consumer was blocked waiting for the page
+     consumer - time spent by the code iterating the stream
+    """
+    phases = ('request', 'decode', 'buffer', 'wait', 'consumer')
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self.origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record(self,
+               phase: str,
+               stream: str,
+               start: float,
+               duration: float,
+               **args):
+        span = Span(phase, stream, start, duration,
+                    threading.get_ident(), args)
+        with self._lock:
+            self.spans.append(span)
+
+    @contextmanager
+    def span(self, phase: str, stream: str, **args):
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self.record(phase, stream, start,
+                        time.perf_counter() - start, **args)
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """Returns {stream: {phase: {count, total, mean, max}}}"""
+        summary = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            phase = summary.setdefault(span.stream, {}).setdefault(
+                span.phase, dict(count=0, total=0.0, mean=0.0, max=0.0))
+            phase['count'] += 1
+            phase['total'] += span.duration
+            phase['max'] = max(phase['max'], span.duration)
+        for phases in summary.values():
+            for phase in phases.values():
+                phase['mean'] = phase['total'] / phase['count']
+        return summary
+
+    def format_summary(self) -> str:
+        lines = []
+        for stream, phases in self.summary().items():
+            lines.append(stream)
+            for name in self.phases:
+                if name in phases:
+                    phase = phases[name]
+                    lines.append(f'  {name:<9}{phase["count"]:>6} pages '
+                                 f'{phase["total"]:>10.4f}s total '
+                                 f'{phase["mean"]:>9.4f}s mean '
+                                 f'{phase["max"]:>9.4f}s max')
+        return '\n'.join(lines)
+
+    def chrome_trace(self) -> Dict:
+        """Returns the spans in Chrome's trace event format, viewable in
+        chrome://tracing or Perfetto"""
+        pid = os.getpid()
+        threads = {thread.ident: thread.name
+                   for thread in threading.enumerate()}
+        with self._lock:
+            spans = list(self.spans)
+        events = [dict(name='thread_name', ph='M', pid=pid, tid=tid,
+                       args=dict(name=threads.get(tid, str(tid))))
+                  for tid in sorted(set(span.thread for span in spans))]
+        for span in spans:
+            events.append(dict(name=span.phase,
+                               cat=span.stream,
+                               ph='X',
+                               ts=(span.start - self.origin) * 1e6,
+                               dur=span.duration * 1e6,
+                               pid=pid,
+                               tid=span.thread,
+                               args=dict(span.args, stream=span.stream)))
+        return dict(traceEvents=events, displayTimeUnit='ms')
+
+    def dump_chrome_trace(self, path: str):
+        with open(path, 'w', encoding='utf-8') as trace:
+            json.dump(self.chrome_trace(), trace)
+
+    def clear(self):
+        with self._lock:
+            self.spans = []
+
+    def __repr__(self):
+        return f'<Profiler {len(self.spans)} spans>'
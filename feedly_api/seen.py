@@ -0,0 +1,276 @@
+import math
+import mmap
+import os
+import struct
+import threading
+from hashlib import blake2b
+from typing import Any, Callable, List, Union
+
+
+class _Slice:
+    """One fixed-size Bloom filter inside a ScalableBloomFilter buffer"""
+    header = struct.Struct('<QQIIQ')  # capacity, bits, hashes, pad, count
+
+    def __init__(self, buffer: Union[bytearray, mmap.mmap], offset: int):
+        self.buffer = buffer
+        self.offset = offset
+        (self.capacity, self.num_bits, self.num_hashes,
+         _, self.count) = self.header.unpack_from(buffer, offset)
+        self.data_offset = offset + self.header.size
+
+    @classmethod
+    def size(cls, num_bits: int) -> int:
+        return cls.header.size + num_bits // 8
+
+    @staticmethod
+    def dimensions(capacity: int, error_rate: float):
+        num_bits = math.ceil(-capacity * math.log(error_rate)
+                             / math.log(2) ** 2)
+        num_bits += -num_bits % 8
+        num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+        return num_bits, num_hashes
+
+    @classmethod
+    def write(cls, buffer, offset: int, capacity: int, num_bits: int,
+              num_hashes: int):
+        cls.header.pack_into(buffer, offset, capacity, num_bits, num_hashes,
+                             0, 0)
+        return cls(buffer, offset)
+
+    def positions(self, h1: int, h2: int):
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def __contains__(self, hashes) -> bool:
+        buffer, base = self.buffer, self.data_offset
+        return all(buffer[base + bit // 8] & (1 << bit % 8)
+                   for bit in self.positions(*hashes))
+
+    def add(self, hashes):
+        buffer, base = self.buffer, self.data_offset
+        for bit in self.positions(*hashes):
+            buffer[base + bit // 8] |= 1 << bit % 8
+        self.count += 1
+        self.header.pack_into(buffer, self.offset, self.capacity,
+                              self.num_bits, self.num_hashes, 0, self.count)
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+
+class ScalableBloomFilter:
+    """
+    A Bloom filter that adds larger, tighter slices as it fills up, so
+    its false positive rate stays near :error_rate: however many keys
+    are added. With a :path: the filter is memory-mapped from that file
+    and persists between runs; otherwise it lives in memory.
+    """
+    magic = b'FDLYSEEN'
+    version = 1
+    header = struct.Struct('<8sHHIQd')  # magic, version, slices, growth,
+    #                                     initial capacity, error rate
+    tightening = 0.5
+
+    def __init__(self,
+                 path: str = None,
+                 initial_capacity: int = 1000000,
+                 error_rate: float = 0.001,
+                 growth: int = 2):
+        """
+        :param path: file to memory-map; created if it does not exist.
+         An existing file keeps the parameters it was created with.
+        :param initial_capacity: number of keys the first slice holds
+        :param error_rate: target false positive rate
+        :param growth: capacity multiplier for each new slice
+        """
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+        if path and os.path.exists(path) and os.path.getsize(path):
+            self._file = open(path, 'r+b')
+            self.buffer = mmap.mmap(self._file.fileno(), 0)
+            if len(self.buffer) < self.header.size:
+                self.close()
+                raise ValueError(f'{path} is not a seen-set file')
+            (magic, version, _, self.growth, self.initial_capacity,
+             self.error_rate) = self.header.unpack_from(self.buffer, 0)
+            if magic != self.magic or version != self.version:
+                self.close()
+                raise ValueError(f'{path} is not a seen-set file')
+        else:
+            self.initial_capacity = initial_capacity
+            self.error_rate = error_rate
+            self.growth = growth
+            if path:
+                self._file = open(path, 'w+b')
+            self.buffer = None
+            self._resize(self.header.size)
+            self._write_header(0)
+        self.slices: List[_Slice] = []
+        try:
+            self._load_slices()
+        except (ValueError, struct.error):
+            self.close()
+            raise ValueError(f'{path} is truncated') from None
+
+    def _write_header(self, num_slices: int):
+        self.header.pack_into(self.buffer, 0, self.magic, self.version,
+                              num_slices, self.growth, self.initial_capacity,
+                              self.error_rate)
+
+    def _resize(self, size: int):
+        if self._file is None:
+            if self.buffer is None:
+                self.buffer = bytearray(size)
+            else:
+                self.buffer.extend(bytes(size - len(self.buffer)))
+            return
+        if self.buffer is not None:
+            self.buffer.flush()
+            self.buffer.close()
+        self._file.truncate(size)
+        self.buffer = mmap.mmap(self._file.fileno(), size)
+
+    def _load_slices(self):
+        num_slices = self.header.unpack_from(self.buffer, 0)[2]
+        self.slices = []
+        offset = self.header.size
+        for _ in range(num_slices):
+            bloom_slice = _Slice(self.buffer, offset)
+            self.slices.append(bloom_slice)
+            offset += _Slice.size(bloom_slice.num_bits)
+        if offset > len(self.buffer):
+            raise ValueError('slices extend past the end of the buffer')
+
+    def _grow(self):
+        index = len(self.slices)
+        capacity = self.initial_capacity * self.growth ** index
+        error_rate = (self.error_rate * (1 - self.tightening)
+                      * self.tightening ** index)
+        num_bits, num_hashes = _Slice.dimensions(capacity, error_rate)
+        offset = len(self.buffer)
+        self._resize(offset + _Slice.size(num_bits))
+        self._write_header(index + 1)
+        _Slice.write(self.buffer, offset, capacity, num_bits, num_hashes)
+        self._load_slices()
+
+    @staticmethod
+    def hashes(key: Union[str, bytes]):
+        if isinstance(key, str):
+            key = key.encode('utf-8')
+        digest = blake2b(key, digest_size=16).digest()
+        return (int.from_bytes(digest[:8], 'little'),
+                int.from_bytes(digest[8:], 'little') | 1)
+
+    def __contains__(self, key: Union[str, bytes]) -> bool:
+        hashes = self.hashes(key)
+        with self._lock:
+            return any(hashes in bloom_slice
+                       for bloom_slice in reversed(self.slices))
+
+    def add(self, key: Union[str, bytes]) -> bool:
+        """Adds :key:; returns False if it was (probably) already present"""
+        hashes = self.hashes(key)
+        with self._lock:
+            if any(hashes in bloom_slice for bloom_slice in self.slices):
+                return False
+            if not self.slices or self.slices[-1].full:
+                self._grow()
+            self.slices[-1].add(hashes)
+            return True
+
+    def __len__(self):
+        return sum(bloom_slice.count for bloom_slice in self.slices)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.buffer)
+
+    def flush(self):
+        if self._file is not None:
+            with self._lock:
+                self.buffer.flush()
+
+    def close(self):
+        if self._file is not None:
+            self.buffer.flush()
+            self.buffer.close()
+            self._file.close()
+            self._file = None
+        self.buffer = None
+        self.slices = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return f'<ScalableBloomFilter {len(self)} keys ({self.path})>'
+
+
+class SeenSet:
+    """
+    Remembers which entry ids have already been processed, using a
+    ScalableBloomFilter so memory stays flat as the id history grows.
+    Ids are reported as seen with a false positive rate of roughly
+    :error_rate:; unseen ids are never reported as seen.
+
+    Instances are callable, so they can be used as stream filters on
+    IDStream and ContentStream:
+     with SeenSet('seen.bloom') as seen:
+         for entry in stream.add_filter(seen): ...
+    """
+    def __init__(self,
+                 path: str = None,
+                 initial_capacity: int = 1000000,
+                 error_rate: float = 0.001,
+                 key: Callable[[Any], str] = None,
+                 mark: bool = True):
+        """
+        :param path: file the set is memory-mapped from and persisted to
+        :param key: extracts the id from an item; by default strings are
+         used as-is and dicts by their 'id'
+        :param mark: when filtering, record passed items as seen
+        """
+        self.bloom = ScalableBloomFilter(path, initial_capacity, error_rate)
+        self.key = key or self.default_key
+        self.mark = mark
+
+    @staticmethod
+    def default_key(item: Any) -> str:
+        if isinstance(item, dict):
+            return item['id']
+        return item
+
+    def __contains__(self, item: Any) -> bool:
+        return self.key(item) in self.bloom
+
+    def add(self, item: Any) -> bool:
+        return self.bloom.add(self.key(item))
+
+    def __call__(self, item: Any) -> bool:
+        """Returns True if :item: has not been seen"""
+        if self.mark:
+            return self.add(item)
+        return item not in self
+
+    def __len__(self):
+        return len(self.bloom)
+
+    def flush(self):
+        self.bloom.flush()
+
+    def close(self):
+        self.bloom.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return f'<SeenSet {len(self)} ids>'
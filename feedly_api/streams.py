@@ -1,8 +1,15 @@
 import logging
-from typing import Callable, Any, Union
+import copy
+import html
+import re
+import threading
+import time
+from contextlib import nullcontext
+from typing import Callable, Any, Union, Iterable, List, Tuple
 from collections import deque
 
 from feedly_api.client import BaseAPIClient
+from feedly_api.deadline import Deadline
 from feedly_api.utils import not_none
 
 
@@ -10,6 +17,7 @@ class StreamID:
     """
     Parses stream ids in format:
      '[user|enterprise]/[user_id]/[source_type]/[source_id]'
+    or 'feed/[feed_url]'
     """
     def __init__(self,
                  stream_id: str,
@@ -32,7 +40,10 @@ class StreamID:
 
     @classmethod
     def from_id_string(cls, stream_id: str):
-        pieces = stream_id.split('/')
+        if stream_id.startswith('feed/'):
+            return FeedStreamID(stream_id, 'feed', None, 'feed',
+                                stream_id[len('feed/'):])
+        pieces = stream_id.split('/', 3)
         if len(pieces) != 4:
             raise ValueError(('id_ must be in format:\n[user|enterprise]/'
                               '[user_id]/[source_type]/[source_id]'))
@@ -50,8 +61,11 @@ class StreamID:
     def is_tag(self):
         return self.source_type == 'tag'
 
+    def __str__(self):
+        return self.stream_id
+
     def __repr__(self):
-        return f'<StreamID self.stream_id>'
+        return f'<StreamID {self.stream_id}>'
 
 
 class UserStreamID(StreamID):
@@ -62,10 +76,75 @@ class EnterpriseStreamID(StreamID):
     pass
 
 
+class FeedStreamID(StreamID):
+    pass
+
+
+class Projection:
+    """
+    Trims stream items down to the fields a consumer needs. Applied to
+    each page as soon as it is decoded, so dropped fields are never
+    buffered.
+    """
+    html_fields = ('content', 'summary')
+    _ignored = re.compile(r'<(script|style)\b.*?</\1\s*>',
+                          re.IGNORECASE | re.DOTALL)
+    _tag = re.compile(r'<[^>]*>')
+    _space = re.compile(r'\s+')
+
+    def __init__(self,
+                 fields: Iterable[str] = None,
+                 strip_html: bool = False,
+                 max_length: int = None):
+        """
+        :param fields: top-level item fields to keep (e.g. 'id', 'title',
+         'alternate', 'published', 'crawled'); None keeps every field
+        :param strip_html: replace 'content' and 'summary' bodies with
+         their plain text
+        :param max_length: truncate 'content' and 'summary' bodies to at
+         most this many characters
+        """
+        self.fields = tuple(fields) if fields is not None else None
+        self.strip_html = strip_html
+        self.max_length = max_length
+
+    def trim(self, body: str) -> str:
+        if self.strip_html:
+            body = self._tag.sub(' ', self._ignored.sub(' ', body))
+            body = self._space.sub(' ', html.unescape(body)).strip()
+        if self.max_length is not None:
+            body = body[:self.max_length]
+        return body
+
+    def __call__(self, item: Any) -> Any:
+        if not isinstance(item, dict):
+            return item
+        if self.fields is not None:
+            item = dict((k, item[k]) for k in self.fields if k in item)
+        if self.strip_html or self.max_length is not None:
+            for name in self.html_fields:
+                body = item.get(name)
+                if isinstance(body, dict) and body.get('content'):
+                    item[name] = dict(body, content=self.trim(body['content']))
+        return item
+
+    def __repr__(self):
+        return f'<Projection {self.fields}>'
+
+
 class StreamOptions:
     """
     Container class for stream options outlined at
     https://developers.feedly.com/v3/streams/
+
+    Options are only read by streams, so one instance can be shared by
+    any number of them. Besides the API parameters:
+     :max_count: caps the number of items downloaded per stream
+     :prefetch: number of pages fetched ahead in a background thread
+     :max_buffered_items: / :max_buffered_bytes: cap what a stream holds
+      in memory (the page being consumed included); prefetching waits
+      for room, and page sizes are reduced to fit (for bytes, going by
+      the size of the items of the previous page)
     """
     def __init__(self,
                  count: int = 20,
@@ -75,7 +154,11 @@ class StreamOptions:
                  max_count: int = 100,
                  continuation: str = '',
                  show_muted: bool = False,
-                 important_only: bool = False,):
+                 important_only: bool = False,
+                 projection: Projection = None,
+                 prefetch: int = 0,
+                 max_buffered_items: int = None,
+                 max_buffered_bytes: int = None):
         self.count = count
         self.ranked = ranked
         self.unread_only = unread_only
@@ -84,26 +167,270 @@ class StreamOptions:
         self.continuation = continuation
         self.show_muted = show_muted
         self.important_only = important_only
+        self.projection = projection
+        self.prefetch = prefetch
+        self.max_buffered_items = max_buffered_items
+        self.max_buffered_bytes = max_buffered_bytes
+
+    def replace(self, **changes):
+        """Returns a copy of these options with :changes: applied"""
+        options = copy.copy(self)
+        for name, value in changes.items():
+            if not hasattr(options, name):
+                raise AttributeError(f'Unknown stream option: {name}')
+            setattr(options, name, value)
+        return options
 
-    def get_options(self):
-        options = dict(count=self.count,
+    def get_options(self, continuation: str = None, count: int = None):
+        if continuation is None:
+            continuation = self.continuation
+        options = dict(count=count or self.count,
                        ranked=self.ranked,
                        unreadOnly=self.unread_only,
                        newerThan=self.newer_than,
-                       continuation=self.continuation,
+                       continuation=continuation,
                        showMuted=self.show_muted,
                        importantOnly=self.important_only)
         return not_none(options)
 
 
+class SearchOptions(StreamOptions):
+    """
+    Options for searching a stream's contents, outlined at
+    https://developers.feedly.com/v3/search/
+
+    Matching happens server side, so only hits are downloaded. Paging,
+    prefetching and buffering work as for StreamOptions.
+    """
+    def __init__(self,
+                 query: str,
+                 count: int = 20,
+                 unread_only: bool = False,
+                 newer_than: int = None,
+                 max_count: int = 100,
+                 continuation: str = '',
+                 fields: Iterable[str] = None,
+                 embedded: str = None,
+                 engagement: str = None,
+                 locale: str = None,
+                 projection: Projection = None,
+                 prefetch: int = 0,
+                 max_buffered_items: int = None,
+                 max_buffered_bytes: int = None):
+        """
+        :param query: search terms
+        :param fields: item fields to search in ('title', 'author',
+         'keywords', ...); all of them if None
+        :param embedded: only items embedding 'audio', 'video', 'doc' or
+         'any' media
+        :param engagement: only items with 'medium' or 'high' engagement
+        :param locale: language hint for the query, e.g. 'en'
+        """
+        super().__init__(count=count,
+                         unread_only=unread_only,
+                         newer_than=newer_than,
+                         max_count=max_count,
+                         continuation=continuation,
+                         projection=projection,
+                         prefetch=prefetch,
+                         max_buffered_items=max_buffered_items,
+                         max_buffered_bytes=max_buffered_bytes)
+        self.query = query
+        self.fields = tuple(fields) if fields is not None else None
+        self.embedded = embedded
+        self.engagement = engagement
+        self.locale = locale
+
+    def get_options(self, continuation: str = None, count: int = None):
+        if continuation is None:
+            continuation = self.continuation
+        options = dict(query=self.query,
+                       count=count or self.count,
+                       unreadOnly=self.unread_only,
+                       newerThan=self.newer_than,
+                       continuation=continuation,
+                       fields=','.join(self.fields) if self.fields else None,
+                       embedded=self.embedded,
+                       engagement=self.engagement,
+                       locale=self.locale)
+        return not_none(options)
+
+
+class MixOptions(StreamOptions):
+    """
+    Options for a stream's mix (its most engaging recent items),
+    outlined at https://developers.feedly.com/v3/mixes/
+
+    Mixes are not paginated: one page of up to :count: items is
+    returned.
+    """
+    def __init__(self,
+                 count: int = 20,
+                 unread_only: bool = False,
+                 hours: int = None,
+                 newer_than: int = None,
+                 backfill: bool = None,
+                 locale: str = None,
+                 projection: Projection = None,
+                 max_buffered_items: int = None,
+                 max_buffered_bytes: int = None):
+        """
+        :param hours: how far back to look for items
+        :param backfill: fill up to :count: with older items when too
+         few recent ones are found
+        :param locale: preferred language of the items, e.g. 'en'
+        """
+        super().__init__(count=count,
+                         unread_only=unread_only,
+                         newer_than=newer_than,
+                         max_count=count,
+                         projection=projection,
+                         max_buffered_items=max_buffered_items,
+                         max_buffered_bytes=max_buffered_bytes)
+        self.hours = hours
+        self.backfill = backfill
+        self.locale = locale
+
+    @property
+    def max_count(self) -> int:
+        # follows count, also when it is changed after construction
+        return self.count
+
+    @max_count.setter
+    def max_count(self, max_count: int):
+        if max_count != self.count:
+            raise AttributeError('A mix is capped by its count; '
+                                 'set count instead of max_count')
+
+    def get_options(self, continuation: str = None, count: int = None):
+        options = dict(count=count or self.count,
+                       unreadOnly=self.unread_only,
+                       hours=self.hours,
+                       newerThan=self.newer_than,
+                       backfill=self.backfill,
+                       locale=self.locale)
+        return not_none(options)
+
+
+class StreamBuffer:
+    """
+    Bounded FIFO of decoded pages shared by a prefetching thread and the
+    consumer of a Stream. A page counts against the limits until the
+    consumer releases it.
+    """
+    def __init__(self,
+                 max_pages: int = 1,
+                 max_items: int = None,
+                 max_bytes: int = None):
+        self.max_pages = max_pages
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.pages = deque()
+        self.items = 0
+        self.bytes = 0
+        self.done = False
+        self.closed = False
+        self.error = None
+        self._condition = threading.Condition()
+
+    def full(self) -> bool:
+        return (len(self.pages) >= self.max_pages
+                or (self.max_items is not None
+                    and self.items >= self.max_items)
+                or (self.max_bytes is not None
+                    and self.bytes >= self.max_bytes))
+
+    def wait_for_space(self) -> bool:
+        """Blocks the producer until a page fits; False once closed"""
+        with self._condition:
+            while self.full() and not self.closed:
+                self._condition.wait()
+            return not self.closed
+
+    def put(self, items: List, size: int):
+        with self._condition:
+            self.pages.append((items, size))
+            self.items += len(items)
+            self.bytes += size
+            self._condition.notify_all()
+
+    def get(self, timeout: float = None) -> Tuple[List, int]:
+        """Blocks the consumer until a page is ready; None when finished
+        or after :timeout: seconds"""
+        with self._condition:
+            self._condition.wait_for(lambda: self.pages or self.done,
+                                     timeout)
+            if self.pages:
+                return self.pages.popleft()
+            if self.error is not None:
+                raise self.error
+            return None
+
+    def release(self, items: int, size: int):
+        with self._condition:
+            self.items -= items
+            self.bytes -= size
+            self._condition.notify_all()
+
+    def finish(self, error: Exception = None):
+        with self._condition:
+            self.done = True
+            self.error = error
+            self._condition.notify_all()
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+    def drain(self) -> List:
+        with self._condition:
+            items = [item for page, _ in self.pages for item in page]
+            self.pages.clear()
+            return items
+
+
+class StreamResult:
+    """Items collected from a stream within a deadline"""
+    def __init__(self, items: List, complete: bool, continuation: str):
+        """
+        :param complete: False if the deadline cut the stream short
+        :param continuation: where the stream would resume
+        """
+        self.items = items
+        self.complete = complete
+        self.continuation = continuation
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __repr__(self):
+        state = 'complete' if self.complete else 'partial'
+        return f'<StreamResult {len(self.items)} items ({state})>'
+
+
 class Stream:
+    """
+    Iterates the items of a Feedly stream page by page. Pagination state
+    (continuation, items fetched so far) belongs to the stream, so
+    iteration resumes where it stopped until :reset: is called.
+
+    With a deadline (see :within:), iteration stops quietly once it
+    expires or is cancelled, between items or pages, and every request
+    is bounded by the time left.
+    """
     def __init__(self,
                  client: BaseAPIClient,
                  stream_id: Union[StreamID, str],
                  options: StreamOptions,
                  stream_type: str,
                  item_prop: str,
-                 item_factory: Callable[[str], Any]):
+                 item_factory: Callable[[str], Any],
+                 projection: Projection = None,
+                 filters: Iterable[Callable[[Any], bool]] = None):
         self._client = client
         if isinstance(stream_id, StreamID):
             self.stream_id = stream_id
@@ -113,38 +440,218 @@ class Stream:
         self.stream_type = stream_type
         self.item_prop = item_prop
         self.item_factory = item_factory
+        self.projection = projection or options.projection
+        self.filters = list(filters or [])
+        self.continuation = options.continuation
+        self.fetched = 0
         self.buffer = deque()
+        self.deadline = None
+        self.item_bytes = None  # decoded bytes per item of the last page
+        # prefetching thread left running by an interrupted iteration
+        self._producer = None
+
+    def within(self, deadline: Union[Deadline, float]):
+        """Bounds the next iterations by :deadline: (a Deadline or a
+        number of seconds from now)"""
+        if not isinstance(deadline, Deadline):
+            deadline = Deadline(deadline)
+        self.deadline = deadline
+        return self
+
+    def _out_of_time(self) -> bool:
+        return self.deadline is not None and self.deadline.expired
+
+    def collect(self, deadline: Union[Deadline, float] = None) -> StreamResult:
+        """
+        Returns the stream's items, or as many as :deadline: allows.
+        Pages already downloaded when the deadline expires are part of
+        the result, so its continuation resumes right after its items.
+
+        :param deadline: bounds this call only; a deadline set with
+         :within: applies if None
+        """
+        previous = self.deadline
+        if deadline is not None:
+            self.within(deadline)
+        try:
+            items = list(self)
+            self._settle()
+            items.extend(map(self.item_factory, self.buffer))
+            self.buffer.clear()
+        finally:
+            if deadline is not None:
+                self.deadline = previous
+        return StreamResult(items, self.exhausted, self.continuation)
+
+    def add_filter(self, item_filter: Callable[[Any], bool]):
+        """Items for which :item_filter: returns False are dropped. They
+        still count towards max_count, which bounds what is downloaded.
+        Filters see items before the stream's projection is applied."""
+        self.filters.append(item_filter)
+        return self
+
+    def accepts(self, item: Any) -> bool:
+        return all(item_filter(item) for item_filter in self.filters)
 
     def reset(self):
-        self.options.continuation = ''
+        self._settle()
+        self.continuation = self.options.continuation
+        self.fetched = 0
+        self.buffer.clear()
+
+    @property
+    def exhausted(self) -> bool:
+        return not self.buffer and (self.continuation is None
+                                    or self.fetched >= self.options.max_count)
+
+    def page_size(self) -> int:
+        count = min(self.options.count,
+                    self.options.max_count - self.fetched)
+        if self.options.max_buffered_items:
+            count = min(count, self.options.max_buffered_items)
+        if self.options.max_buffered_bytes and self.item_bytes:
+            count = min(count,
+                        int(self.options.max_buffered_bytes
+                            // self.item_bytes))
+        return max(count, 1)
+
+    def request_page(self, count: int):
+        return self._client.get_stream_contents(str(self.stream_id),
+                                                self.stream_type,
+                                                self.options,
+                                                continuation=self.continuation,
+                                                count=count,
+                                                deadline=self.deadline)
+
+    @property
+    def profiler(self):
+        return getattr(self._client, 'profiler', None)
+
+    def _timed(self, phase: str, **args):
+        profiler = self.profiler
+        if profiler is None:
+            return nullcontext(args)
+        return profiler.span(phase, str(self.stream_id), **args)
+
+    def fetch_page(self) -> Tuple[List, int]:
+        """Downloads the next page and advances the continuation. Returns
+        the projected, filtered items and the page's decoded size."""
+        started = time.perf_counter()
+        response = self.request_page(self.page_size())
+        decoding = time.perf_counter()
+        resp = response.json()
+        self.continuation = resp.get('continuation')
+        items = resp.get(self.item_prop) or []
+        if not items:
+            self.continuation = None
+        else:
+            self.item_bytes = len(response.content) / len(items)
+        items = items[:self.options.max_count - self.fetched]
+        self.fetched += len(items)
+        # filters (dedup, seen-sets) see the full item, before the
+        # projection drops the fields they match on
+        items = [i for i in items if self.accepts(i)]
+        if self.projection:
+            items = [self.projection(i) for i in items]
+        logging.debug(f'{len(items)} items (continuation='
+                      f'{self.continuation})')
+        profiler = self.profiler
+        if profiler is not None:
+            stream = str(self.stream_id)
+            profiler.record('request', stream, started, decoding - started,
+                            ttfb=response.elapsed.total_seconds(),
+                            bytes=len(response.content))
+            profiler.record('decode', stream, decoding,
+                            time.perf_counter() - decoding,
+                            items=len(items))
+        return items, len(response.content)
+
+    def _consume_buffer(self):
+        with self._timed('consumer', items=len(self.buffer)):
+            while self.buffer and not self._out_of_time():
+                yield self.item_factory(self.buffer.popleft())
 
     def __iter__(self):
         logging.debug(f'downloading at most {self.options.max_count}'
                       f' articles in chunks of {self.options.count}')
+        self._settle()
+        if self.options.prefetch:
+            yield from self._iter_prefetched()
+            return
 
-        downloaded = 0
-        while (downloaded < self.options.max_count
-               and (self.options.continuation is not None or self.buffer)):
-            while self.buffer:
-                i = self.buffer.popleft()
-                yield self.item_factory(i)
-                downloaded += 1
-                if downloaded == self.options.max_count:
-                    break
-
-            if (self.options.continuation is not None
-                    and downloaded < self.options.max_count):
-                resp = self._client.get_stream_contents(str(self.stream_id),
-                                                        self.stream_type,
-                                                        self.options).json()
-                self.options.continuation = resp.get('continuation')
-                if resp and self.item_prop in resp:
-                    self.buffer = deque(resp.get(self.item_prop))
-                    logging.debug(f'{len(self.buffer)} items (continuation='
-                                  f'{self.options.continuation})')
-
+        while not self.exhausted and not self._out_of_time():
+            if not self.buffer:
+                with self._timed('wait'):
+                    try:
+                        items, _ = self.fetch_page()
+                    except Exception:
+                        if self._out_of_time():
+                            return  # partial result
+                        raise
+                with self._timed('buffer', items=len(items)):
+                    self.buffer.extend(items)
+            yield from self._consume_buffer()
 
+    def _settle(self):
+        """Waits for a prefetching thread left running by an interrupted
+        iteration, keeping the page it was fetching"""
+        if self._producer is not None:
+            producer, buffer = self._producer
+            self._producer = None
+            producer.join()
+            self.buffer.extend(buffer.drain())
 
+    def _prefetch(self, buffer: StreamBuffer):
+        try:
+            while (self.continuation is not None
+                   and self.fetched < self.options.max_count
+                   and not self._out_of_time()
+                   and buffer.wait_for_space()):
+                buffer.put(*self.fetch_page())
+        except Exception as e:
+            buffer.finish(e)
+        else:
+            buffer.finish()
 
+    def _next_prefetched(self, buffer: StreamBuffer) -> Tuple[List, int]:
+        if self._out_of_time():
+            return None
+        timeout = None
+        if self.deadline is not None:
+            timeout = self.deadline.remaining()
+        with self._timed('wait'):
+            try:
+                return buffer.get(timeout)
+            except Exception:
+                if self._out_of_time():
+                    return None  # partial result
+                raise
 
+    def _iter_prefetched(self):
+        if self.buffer:  # left over from an interrupted iteration
+            yield from self._consume_buffer()
 
+        buffer = StreamBuffer(self.options.prefetch,
+                              self.options.max_buffered_items,
+                              self.options.max_buffered_bytes)
+        producer = threading.Thread(target=self._prefetch,
+                                    args=(buffer,),
+                                    daemon=True)
+        producer.start()
+        try:
+            page = self._next_prefetched(buffer)
+            while page is not None:
+                items, size = page
+                with self._timed('buffer', items=len(items)):
+                    self.buffer.extend(items)
+                yield from self._consume_buffer()
+                buffer.release(len(items), size)
+                page = self._next_prefetched(buffer)
+        finally:
+            # keep pages fetched ahead so the next iteration resumes
+            # exactly where this one stopped. A request still in flight
+            # is not waited for here: its page is picked up by _settle
+            buffer.close()
+            if producer.is_alive():
+                self._producer = (producer, buffer)
+            self.buffer.extend(buffer.drain())
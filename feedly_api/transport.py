@@ -0,0 +1,193 @@
+import base64
+import hashlib
+import io
+import json
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+from typing import Any, Callable, Dict, MutableMapping, Protocol, Union
+
+from requests import Request, Session
+from requests.exceptions import ReadTimeout
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+from feedly_api.client import TransferStats, count_wire_bytes
+from feedly_api.exceptions import CassetteMissError
+
+
+class Transport(Protocol):
+    """
+    What BaseAPIClient sends its requests through: a ``request`` method
+    with the signature of requests.Session.request, a mutable
+    ``headers`` mapping sent with every request, and ``close``. A
+    requests.Session already is one, and is the default.
+    """
+    headers: MutableMapping[str, str]
+
+    def request(self, method: str, url: str, **kwargs) -> Response:
+        ...
+
+    def close(self) -> None:
+        ...
+
+
+def interaction_key(method: str,
+                    url: str,
+                    params: Dict = None,
+                    data: Any = None) -> str:
+    """Identifies a request by method, full URL and body digest"""
+    full_url = Request(method, url, params=params).prepare().url
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    if isinstance(data, bytes):
+        digest = hashlib.sha1(data).hexdigest()
+    else:
+        digest = ''
+    return f'{method.upper()} {full_url} {digest}'
+
+
+class RecordingTransport:
+    """
+    Passes requests through to :transport: (a new Session by default)
+    and appends each response to :cassette:, a JSON-lines file that
+    ReplayTransport can serve later. Request headers (and so tokens)
+    are never written.
+    """
+    def __init__(self, cassette: str, transport: Any = None):
+        self.cassette = cassette
+        self.transport = transport if transport is not None else Session()
+        hooks = getattr(self.transport, 'hooks', None)
+        if hooks is not None and count_wire_bytes not in hooks['response']:
+            hooks['response'].append(count_wire_bytes)
+        self._lock = threading.Lock()
+
+    @property
+    def headers(self):
+        return self.transport.headers
+
+    def request(self, method: str, url: str, **kwargs) -> Response:
+        started = time.perf_counter()
+        response = self.transport.request(method, url, **kwargs)
+        content = response.content
+        elapsed = time.perf_counter() - started
+        wire_bytes = TransferStats.wire_size(response, len(content))
+        interaction = dict(
+            key=interaction_key(method, url, kwargs.get('params'),
+                                kwargs.get('data')),
+            status_code=response.status_code,
+            reason=response.reason,
+            url=response.url,
+            headers=dict(response.headers),
+            encoding=response.encoding,
+            body=base64.b64encode(content).decode('ascii'),
+            elapsed=elapsed,
+            wire_bytes=wire_bytes)
+        with self._lock:
+            with open(self.cassette, 'a', encoding='utf-8') as cassette:
+                cassette.write(json.dumps(interaction) + '\n')
+        return response
+
+    def close(self):
+        self.transport.close()
+
+
+class ReplayTransport:
+    """
+    Serves responses recorded by RecordingTransport, without network
+    access. Repeated requests get the recorded responses in order (so
+    paginated streams replay page by page); once those run out the last
+    one is repeated, or CassetteMissError is raised if :strict:.
+
+    :latency: simulates network time per response: seconds, a callable
+    taking the recorded interaction, or 'recorded' to reuse the recorded
+    time scaled by :speed:. A simulated latency longer than the request
+    timeout raises ReadTimeout, as a slow server would.
+    """
+    # the recorded body is already decoded; compared lower-cased
+    dropped_headers = ('content-encoding', 'transfer-encoding',
+                       'content-length')
+
+    def __init__(self,
+                 cassette: str,
+                 latency: Union[float, str, Callable[[Dict], float]] = 0,
+                 speed: float = 1.0,
+                 strict: bool = False):
+        self.headers = CaseInsensitiveDict()
+        self.cassette = cassette
+        self.latency = latency
+        self.speed = speed
+        self.strict = strict
+        self.interactions: Dict[str, deque] = {}
+        self._last: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        with open(cassette, encoding='utf-8') as lines:
+            for line in lines:
+                if line.strip():
+                    interaction = json.loads(line)
+                    self.interactions.setdefault(interaction['key'],
+                                                 deque()).append(interaction)
+
+    def delay(self, interaction: Dict) -> float:
+        if self.latency == 'recorded':
+            return interaction['elapsed'] / self.speed
+        if callable(self.latency):
+            return self.latency(interaction)
+        return self.latency or 0
+
+    def _next(self, key: str) -> Dict:
+        with self._lock:
+            queue = self.interactions.get(key)
+            if queue:
+                self._last[key] = queue.popleft()
+                return self._last[key]
+            if key in self._last and not self.strict:
+                return self._last[key]
+        raise CassetteMissError(f'No recorded response for {key}')
+
+    def request(self, method: str, url: str, **kwargs) -> Response:
+        key = interaction_key(method, url, kwargs.get('params'),
+                              kwargs.get('data'))
+        interaction = self._next(key)
+        delay = self.delay(interaction)
+        timeout = kwargs.get('timeout')
+        if isinstance(timeout, tuple):
+            timeout = timeout[-1]
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise ReadTimeout(f'Replayed response for {key} took '
+                              f'{delay:.3f}s (timeout {timeout}s)')
+        time.sleep(delay)
+
+        response = Response()
+        response.status_code = interaction['status_code']
+        response.reason = interaction['reason']
+        response.url = interaction['url']
+        response.encoding = interaction['encoding']
+        response.headers = CaseInsensitiveDict(
+            (k, v) for k, v in interaction['headers'].items()
+            if k.lower() not in self.dropped_headers)
+        body = base64.b64decode(interaction['body'])
+        response._content = body
+        response._content_consumed = True  # iter_content serves _content
+        response.raw = io.BytesIO(body)
+        # report the transfer as recorded, not as decoded
+        response.wire_bytes = interaction.get('wire_bytes')
+        response.wire_encoding = CaseInsensitiveDict(
+            interaction['headers']).get('Content-Encoding')
+        response.elapsed = timedelta(seconds=delay)
+        response.request = Request(method,
+                                   url,
+                                   params=kwargs.get('params')).prepare()
+        return response
+
+    def close(self):
+        pass
+
+    @property
+    def remaining(self) -> int:
+        return sum(len(queue) for queue in self.interactions.values())
+
+    def __repr__(self):
+        return f'<ReplayTransport {self.cassette} ({self.remaining} left)>'
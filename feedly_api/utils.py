@@ -1,5 +1,12 @@
+import io
+import mimetypes
+import os
+import sys
 from urllib.parse import quote as qt
-from typing import Dict, Union, Iterable
+from typing import Dict, Union, Iterable, BinaryIO
+
+
+Upload = Union[str, os.PathLike, bytes, BinaryIO]
 
 
 def quote(string: str, **kwargs):
@@ -38,3 +45,119 @@ class NoEmpty(dict):
             for k, v in kwargs.items():
                 if v is not None:
                     self[k] = v
+
+
+class MultipartFile:
+    """
+    A multipart/form-data request body holding a single file, read from
+    :fileobj: as the request is sent instead of being loaded into memory.
+    For seekable files the length is known up front, so the body is sent
+    with a Content-Length and rewinds for retries. Non-seekable ones
+    (pipes, response bodies) are sent chunked, and can only be sent once.
+    """
+    def __init__(self,
+                 fileobj: BinaryIO,
+                 field: str = 'file',
+                 filename: str = None,
+                 content_type: str = None):
+        if filename is None:
+            name = getattr(fileobj, 'name', None)
+            # pipes and sockets are named by their file descriptor
+            filename = os.path.basename(name) if isinstance(name, str) else ''
+        filename = filename or field
+        if content_type is None:
+            content_type = (mimetypes.guess_type(filename)[0]
+                            or 'application/octet-stream')
+        self.boundary = os.urandom(16).hex()
+        self.head = (f'--{self.boundary}\r\n'
+                     f'Content-Disposition: form-data; name="{field}"; '
+                     f'filename="{filename}"\r\n'
+                     f'Content-Type: {content_type}\r\n\r\n').encode()
+        self.tail = f'\r\n--{self.boundary}--\r\n'.encode()
+        self.fileobj = fileobj
+        try:
+            if not fileobj.seekable():
+                raise io.UnsupportedOperation('not seekable')
+            self.start = fileobj.tell()
+            self.size = fileobj.seek(0, io.SEEK_END) - self.start
+            fileobj.seek(self.start)
+        except (AttributeError, OSError):
+            self.start = None
+            self.size = None  # known once the file is read to its end
+        self.seekable = self.start is not None
+        self.position = 0
+
+    @property
+    def content_type(self) -> str:
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __len__(self):
+        # requests falls back to a chunked upload when this fails
+        if not self.seekable:
+            raise TypeError('length of a non-seekable upload is unknown')
+        return len(self.head) + self.size + len(self.tail)
+
+    def __bool__(self):
+        return True
+
+    def __iter__(self):
+        chunk = self.read(64 * 1024)
+        while chunk:
+            yield chunk
+            chunk = self.read(64 * 1024)
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += len(self)
+        if not self.seekable:
+            if offset != self.position:
+                raise io.UnsupportedOperation(
+                    'cannot rewind a non-seekable upload')
+            return self.position
+        self.position = min(max(offset, 0), len(self))
+        return self.position
+
+    def read(self, size: int = -1) -> bytes:
+        unbounded = size is None or size < 0
+        if unbounded:
+            size = sys.maxsize
+        chunks = []
+        head_end = len(self.head)
+        while size > 0:
+            if self.position < head_end:
+                chunk = self.head[self.position:self.position + size]
+            elif self.size is None:
+                chunk = self.fileobj.read(-1 if unbounded else size)
+                if not chunk:
+                    self.size = self.position - head_end
+                    continue
+            elif self.position < head_end + self.size:
+                self.fileobj.seek(self.start + self.position - head_end)
+                chunk = self.fileobj.read(
+                    min(size, head_end + self.size - self.position))
+                if not chunk:
+                    raise ValueError('file shrank while being uploaded')
+            else:
+                offset = self.position - head_end - self.size
+                chunk = self.tail[offset:offset + size]
+                if not chunk:
+                    break
+            chunks.append(chunk)
+            self.position += len(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+
+def open_upload(upload: Upload):
+    """Returns a binary file object for a path, bytes or file object, and
+    whether the caller opened it (and so should close it)"""
+    if isinstance(upload, (str, os.PathLike)):
+        return open(upload, 'rb'), True
+    if isinstance(upload, (bytes, bytearray, memoryview)):
+        return io.BytesIO(upload), True
+    return upload, False
@@ -0,0 +1,259 @@
+import heapq
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Union
+
+from feedly_api.dedup import Deduplicator
+from feedly_api.exceptions import RateLimitError
+from feedly_api.models import FeedlyClient, ContentStream
+from feedly_api.streams import Stream, StreamOptions, StreamID
+
+
+class WatchedStream:
+    """Polling state of one stream followed by a StreamWatcher"""
+    def __init__(self,
+                 stream_id: str,
+                 stream_type: Callable[..., Stream],
+                 options: StreamOptions,
+                 interval: float,
+                 newer_than: int):
+        self.stream_id = stream_id
+        self.stream_type = stream_type
+        self.options = options
+        self.interval = interval
+        self.newer_than = newer_than
+        # set while a poll capped by max_count left entries to fetch
+        self.continuation = None
+        self.window_start = None
+        self.rate = None  # smoothed entries per second
+        self.last_poll = None
+        self.next_poll = 0.0
+        # polls overlap slightly, so remember recent ids to drop repeats
+        self.recent = Deduplicator(max_entries=10 * options.max_count,
+                                   near_duplicates=False)
+
+    def __lt__(self, other: 'WatchedStream'):
+        return self.next_poll < other.next_poll
+
+    def __repr__(self):
+        return f'<WatchedStream {self.stream_id} every {self.interval:.1f}s>'
+
+
+class StreamWatcher:
+    """
+    Long-running poller for many streams. Each stream is requested with
+    newerThan set to its previous poll, and its poll interval follows the
+    stream's observed publish rate: busy streams are polled every
+    :min_interval: seconds, quiet ones back off to :max_interval:. Polls
+    are jittered and at least :spacing: seconds apart, so streams added
+    together do not all hit the API at once.
+
+    New entries are passed to :callback: as (stream_id, items) and/or put
+    on :queue: as (stream_id, item) pairs. For an asyncio.Queue, pass the
+    event loop that owns it as :loop:.
+    """
+    def __init__(self,
+                 client: FeedlyClient,
+                 callback: Callable[[str, List], Any] = None,
+                 queue: Any = None,
+                 loop: Any = None,
+                 min_interval: float = 5,
+                 max_interval: float = 900,
+                 target_per_poll: int = 10,
+                 smoothing: float = 0.3,
+                 spacing: float = 0.1,
+                 jitter: float = 0.1,
+                 overlap: float = 60):
+        """
+        :param target_per_poll: number of new entries a poll should pick
+         up on average; the interval is target_per_poll / publish rate
+        :param smoothing: weight of the latest poll in the publish rate
+        :param jitter: relative random spread applied to every interval
+        :param overlap: seconds each newerThan window reaches back, to
+         pick up entries indexed late
+        """
+        self._client = client
+        self.callback = callback
+        self.queue = queue
+        self.loop = loop
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_per_poll = target_per_poll
+        self.smoothing = smoothing
+        self.spacing = spacing
+        self.jitter = jitter
+        self.overlap = overlap
+        self.streams: Dict[str, WatchedStream] = {}
+        self._schedule: List[WatchedStream] = []
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def watch(self,
+              stream_id: Union[StreamID, str],
+              stream_type: Callable[..., Stream] = ContentStream,
+              options: StreamOptions = None,
+              since: float = None) -> WatchedStream:
+        """
+        :param stream_type: ContentStream or IDStream
+        :param since: epoch seconds to start from; defaults to now
+        """
+        stream_id = str(stream_id)
+        if since is None:
+            since = time.time()
+        watched = WatchedStream(stream_id,
+                                stream_type,
+                                options or StreamOptions(),
+                                self.min_interval,
+                                int(since * 1000))
+        with self._condition:
+            if stream_id in self.streams:
+                return self.streams[stream_id]
+            # spread first polls of streams added together over one
+            # minimum interval
+            watched.next_poll = (time.monotonic()
+                                 + random.uniform(0, self.min_interval))
+            self.streams[stream_id] = watched
+            heapq.heappush(self._schedule, watched)
+            self._condition.notify_all()
+        return watched
+
+    def unwatch(self, stream_id: Union[StreamID, str]):
+        with self._condition:
+            watched = self.streams.pop(str(stream_id), None)
+            if watched in self._schedule:
+                self._schedule.remove(watched)
+                heapq.heapify(self._schedule)
+
+    def next_interval(self, watched: WatchedStream, new_items: int) -> float:
+        now = time.monotonic()
+        if watched.last_poll is not None:
+            observed = new_items / max(now - watched.last_poll, 1e-3)
+            if watched.rate is None:
+                watched.rate = observed
+            else:
+                watched.rate = (self.smoothing * observed
+                                + (1 - self.smoothing) * watched.rate)
+        watched.last_poll = now
+        if watched.rate:
+            interval = self.target_per_poll / watched.rate
+        else:
+            interval = watched.interval * 2
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def poll(self, watched: WatchedStream) -> List:
+        """
+        Fetches entries of :watched: newer than its previous poll. A poll
+        reads at most options.max_count entries; when more are new, the
+        next poll resumes from the continuation in the same window, and
+        newerThan only moves once the window is drained.
+        """
+        if watched.continuation is None:
+            watched.window_start = int(time.time() * 1000)
+        options = watched.options.replace(
+            newer_than=watched.newer_than,
+            continuation=watched.continuation or '')
+        stream = watched.stream_type(self._client,
+                                     watched.stream_id,
+                                     options)
+        items = list(stream.add_filter(watched.recent))
+        watched.continuation = stream.continuation
+        if watched.continuation is None:
+            watched.newer_than = (watched.window_start
+                                  - int(self.overlap * 1000))
+        return items
+
+    def emit(self, stream_id: str, items: List):
+        if self.callback is not None:
+            self.callback(stream_id, items)
+        if self.queue is not None:
+            for item in items:
+                if self.loop is not None:
+                    self.loop.call_soon_threadsafe(self.queue.put_nowait,
+                                                   (stream_id, item))
+                else:
+                    self.queue.put((stream_id, item))
+
+    def _poll_once(self, watched: WatchedStream):
+        try:
+            items = self.poll(watched)
+        except RateLimitError as e:
+            logging.warning(f'rate limited polling {watched.stream_id}: {e}')
+            watched.interval = self.max_interval
+            return
+        except Exception as e:
+            logging.warning(f'error polling {watched.stream_id}: {e}')
+            watched.interval = min(watched.interval * 2, self.max_interval)
+            return
+        watched.interval = self.next_interval(watched, len(items))
+        if items:
+            try:
+                self.emit(watched.stream_id, items)
+            except Exception:
+                # the entries are lost, but the stream keeps being polled
+                logging.exception(f'error delivering {len(items)} entries '
+                                  f'of {watched.stream_id}')
+
+    def _next_due(self, last_poll: float) -> float:
+        if not self._schedule:
+            return None
+        return max(self._schedule[0].next_poll, last_poll + self.spacing)
+
+    def _run(self):
+        last_poll = 0.0
+        while True:
+            with self._condition:
+                while self._running:
+                    now = time.monotonic()
+                    due = self._next_due(last_poll)
+                    if due is not None and due <= now:
+                        break
+                    self._condition.wait(None if due is None else due - now)
+                if not self._running:
+                    return
+                watched = heapq.heappop(self._schedule)
+            last_poll = time.monotonic()
+            try:
+                self._poll_once(watched)
+            finally:
+                self._reschedule(watched)
+
+    def _reschedule(self, watched: WatchedStream):
+        with self._condition:
+            if self.streams.get(watched.stream_id) is watched:
+                spread = watched.interval * self.jitter
+                watched.next_poll = (time.monotonic() + watched.interval
+                                     + random.uniform(-spread, spread))
+                heapq.heappush(self._schedule, watched)
+
+    def run(self):
+        """Polls watched streams until :stop: is called"""
+        self._running = True
+        self._run()
+
+    def start(self) -> threading.Thread:
+        """Runs the watcher in a background thread"""
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout: float = None):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.stop()
+
+    def __repr__(self):
+        return f'<StreamWatcher {len(self.streams)} streams>'
@@ -0,0 +1,86 @@
+import json
+import time
+from datetime import timedelta
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.content = json.dumps(data).encode('utf-8')
+        self.elapsed = timedelta(0)
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class FakeClient:
+    """Serves :total: items paginated by offset continuations. Item i
+    was crawled at :crawled: + i milliseconds, and newerThan is
+    honoured."""
+    def __init__(self, total=50, delay=0.0, item_size=0, crawled=0):
+        self.total = total
+        self.crawled = crawled
+        self.delay = delay
+        self.item_size = item_size
+        self.requests = []
+        self.profiler = None
+
+    def get_stream_contents(self, stream_id, stream_type, options,
+                            continuation=None, count=None, deadline=None):
+        start = int(continuation or 0)
+        count = count or options.count
+        self.requests.append((start, count))
+        time.sleep(self.delay)
+        newer_than = options.get_options().get('newerThan')
+        matching = [i for i in range(self.total)
+                    if newer_than is None or self.crawled + i > newer_than]
+        items = [dict(id=str(i),
+                      crawled=self.crawled + i,
+                      body='x' * self.item_size)
+                 for i in matching[start:start + count]]
+        data = dict(items=items)
+        if start + count < len(matching):
+            data['continuation'] = str(start + count)
+        return FakeResponse(data)
+
+    def get_mix_contents(self, stream_id, options, continuation=None,
+                         count=None, deadline=None):
+        return self.get_stream_contents(stream_id, 'contents', options,
+                                        continuation, count, deadline)
+
+
+class FakeCollection(dict):
+    @property
+    def id(self):
+        return self['id']
+
+    @property
+    def label(self):
+        return self.get('label')
+
+
+class FakeCollectionsClient:
+    """Keeps collections in memory, answering get_collections, .mput
+    of feeds and collection creation"""
+    def __init__(self, collections=()):
+        self.collections = [FakeCollection(collection)
+                            for collection in collections]
+        self.calls = []
+
+    def get_collections(self, enterprise=False):
+        return list(self.collections)
+
+    def _find(self, collection_id):
+        return next(collection for collection in self.collections
+                    if collection.id == collection_id)
+
+    def add_feeds_collection(self, collection_id, feeds, enterprise=False):
+        self.calls.append(('mput', collection_id, len(feeds)))
+        self._find(collection_id).setdefault('feeds', []).extend(feeds)
+
+    def create_or_update_collection(self, label=None, feeds=None,
+                                    enterprise=False, **kwargs):
+        collection = FakeCollection(id=f'user/u/category/{label}',
+                                    label=label, feeds=list(feeds or []))
+        self.collections.append(collection)
+        self.calls.append(('create', collection.id, len(collection['feeds'])))
+        return FakeResponse([dict(collection)])
@@ -0,0 +1,93 @@
+import threading
+import time
+
+from requests.exceptions import ConnectionError, HTTPError
+from requests.models import Response
+
+from feedly_api.batch import WriteBuffer
+from feedly_api.exceptions import BadRequestError, APIServerError
+
+
+def http_error(error_type, status_code):
+    response = Response()
+    response.status_code = status_code
+    response._content = b'{}'
+    return error_type(HTTPError(response=response))
+
+
+class FakeClient:
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.calls = []
+
+    def mark_entries(self, action, entry_ids):
+        self.calls.append((action, list(entry_ids)))
+        if self.errors:
+            raise self.errors.pop(0)
+
+    def tag_entries(self, tag_ids, entry_ids):
+        self.mark_entries('tag', entry_ids)
+
+    def untag_entries(self, tag_ids, entry_ids):
+        self.mark_entries('untag', entry_ids)
+
+
+def test_batches_are_sent_on_close():
+    client = FakeClient()
+    with WriteBuffer(client, max_delay=60) as writes:
+        writes.mark_read(['a', 'b'])
+        writes.mark_read('c')
+    assert client.calls == [('markAsRead', ['a', 'b', 'c'])]
+
+
+def test_opposite_write_cancels_pending_one():
+    client = FakeClient()
+    with WriteBuffer(client, max_delay=60) as writes:
+        writes.mark_read(['a', 'b'])
+        writes.mark_unread(['a'])
+    assert sorted(client.calls) == [('keepUnread', ['a']),
+                                    ('markAsRead', ['b'])]
+
+
+def test_client_errors_are_not_retried():
+    client = FakeClient([http_error(BadRequestError, 400)])
+    writes = WriteBuffer(client, max_delay=60, backoff=0)
+    writes.mark_read(['a'])
+    writes.close()
+    assert len(client.calls) == 1
+    assert len(writes.failed) == 1
+
+
+def test_transient_errors_are_retried():
+    client = FakeClient([http_error(APIServerError, 503),
+                         ConnectionError('reset')])
+    writes = WriteBuffer(client, max_delay=60, backoff=0)
+    writes.mark_read(['a'])
+    writes.close()
+    assert len(client.calls) == 3
+    assert writes.failed == []
+
+
+def test_flush_sends_after_batches_taken_before_it():
+    client = FakeClient()
+    writes = WriteBuffer(client, max_batch=1, max_delay=60)
+    take = writes._take
+    taken = threading.Event()
+
+    def slow_take(force=False):
+        batches = take(force)
+        if batches and threading.current_thread() is writes._thread:
+            # let other threads in between taking and sending
+            writes._condition.release()
+            taken.set()
+            time.sleep(0.2)
+            writes._condition.acquire()
+        return batches
+
+    writes._take = slow_take
+    writes.mark_read('a')
+    assert taken.wait(1)
+    writes.mark_unread('a')
+    writes.flush()
+    writes.close()
+    assert client.calls == [('markAsRead', ['a']), ('keepUnread', ['a'])]
@@ -0,0 +1,130 @@
+import pytest
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+from feedly_api.circuit import CircuitBreaker, CircuitBreakers
+from feedly_api.exceptions import CircuitOpenError
+from feedly_api.models import Auth, FeedlyClient
+
+
+class FakeTransport:
+    def __init__(self, status_code=200, error=None):
+        self.headers = CaseInsensitiveDict()
+        self.status_code = status_code
+        self.error = error
+
+    def request(self, method, url, **kwargs):
+        if self.error is not None:
+            raise self.error
+        response = Response()
+        response.status_code = self.status_code
+        response._content = b'{}'
+        response.url = url
+        return response
+
+    def close(self):
+        pass
+
+
+def client_for(transport, **settings):
+    client = FeedlyClient(Auth(access_token='t'), 'h', retries=1,
+                          transport=transport)
+    client.circuit_breakers = CircuitBreakers(min_requests=2,
+                                              reset_timeout=0, **settings)
+    return client
+
+
+def test_server_errors_open_the_circuit():
+    client = client_for(FakeTransport(503))
+    for _ in range(2):
+        with pytest.raises(Exception):
+            client.get('/v3/streams/x/contents')
+    breaker = client.circuit_breakers['streams']
+    assert breaker.state == CircuitBreaker.OPEN
+    assert client.circuit_breakers['entries'].state == CircuitBreaker.CLOSED
+
+
+def test_client_errors_count_as_successes():
+    client = client_for(FakeTransport(404))
+    for _ in range(3):
+        with pytest.raises(Exception):
+            client.get('/v3/streams/x/contents')
+    assert client.circuit_breakers['streams'].state == CircuitBreaker.CLOSED
+
+
+def test_interrupted_probe_gives_its_slot_back():
+    transport = FakeTransport(503)
+    client = client_for(transport)
+    for _ in range(2):
+        with pytest.raises(Exception):
+            client.get('/v3/streams/x/contents')
+    transport.error = KeyboardInterrupt()
+    with pytest.raises(KeyboardInterrupt):
+        client.get('/v3/streams/x/contents')  # the half-open probe
+    transport.error = None
+    transport.status_code = 200
+    client.get('/v3/streams/x/contents')
+    assert client.circuit_breakers['streams'].state == CircuitBreaker.CLOSED
+
+
+def test_open_circuit_rejects_requests():
+    breaker = CircuitBreaker('streams', min_requests=1, reset_timeout=60)
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+
+def test_expired_deadline_sends_nothing_and_leaves_breaker_alone():
+    from feedly_api.deadline import Deadline
+    from feedly_api.exceptions import DeadlineExceeded
+    transport = FakeTransport(503)
+    client = client_for(transport)
+    for _ in range(2):
+        with pytest.raises(Exception):
+            client.get('/v3/streams/x/contents')
+    breaker = client.circuit_breakers['streams']
+    deadline = Deadline(10)
+    deadline.cancel()
+    with pytest.raises(DeadlineExceeded):
+        client.get('/v3/streams/x/contents', deadline=deadline)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_timeouts_clipped_by_a_deadline_are_not_failures():
+    from requests.exceptions import ReadTimeout
+    from feedly_api.deadline import Deadline
+    client = client_for(FakeTransport(error=ReadTimeout('slow')))
+    for _ in range(3):
+        with pytest.raises(ReadTimeout):
+            client.get('/v3/streams/x/contents', deadline=Deadline(0.5))
+    breaker = client.circuit_breakers['streams']
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.error_rate == 0.0
+
+
+def test_retry_after_token_refresh_keeps_deadline_and_kwargs():
+    from feedly_api.deadline import Deadline
+    sent = []
+
+    class RefreshingTransport(FakeTransport):
+        def request(self, method, url, **kwargs):
+            sent.append(kwargs)
+            self.status_code = 401 if len(sent) == 1 else 200
+            return super().request(method, url, **kwargs)
+
+    client = client_for(RefreshingTransport())
+    client.auth.refresh_token = 'r'
+    client.auth.last_token_refresh_attempt = 0
+    client.refresh_token = lambda: None
+    deadline = Deadline(5)
+    client.get('/v3/streams/x/contents', deadline=deadline,
+               allow_redirects=False)
+    assert len(sent) == 2
+    assert sent[1]['allow_redirects'] is False
+    assert sent[1]['timeout'] <= 5
+
+
+def test_search_and_mixes_share_the_streams_circuit():
+    for endpoint in ('/v3/streams/contents', '/v3/mixes/contents',
+                     '/v3/search/contents'):
+        assert CircuitBreakers.family(endpoint) == 'streams'
@@ -0,0 +1,57 @@
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from requests import Session
+
+from feedly_api.client import BaseAPIClient
+
+BODY = b'{"items": [' + b','.join([b'{"title": "entry"}'] * 2000) + b']}'
+
+
+class GzipHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = gzip.compress(BODY)
+        self.send_response(200)
+        self.send_header('Content-Encoding', 'gzip')
+        if self.path == '/chunked':
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for start in range(0, len(body), 100):
+                chunk = body[start:start + 100]
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+            self.wfile.write(b'0\r\n\r\n')
+        else:
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), GzipHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+
+
+@pytest.mark.parametrize('path', ['/chunked', '/length'])
+@pytest.mark.parametrize('stream', [False, True])
+def test_records_compressed_size_as_received(server, path, stream):
+    client = BaseAPIClient(transport=Session())
+    response = client.session.get(server + path, stream=stream)
+    if stream:
+        assert b''.join(client.iter_content(response)) == BODY
+    else:
+        client.transfer_stats.record(response, path)
+    record = client.transfer_stats.last
+    assert record.decompressed_bytes == len(BODY)
+    compressed = len(gzip.compress(BODY))
+    # chunk framing counts as received too
+    assert compressed <= record.compressed_bytes < compressed * 1.2
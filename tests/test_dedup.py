@@ -0,0 +1,88 @@
+import random
+import time
+
+from feedly_api.dedup import Deduplicator, canonical_url, simhash
+
+VOCABULARY = [''.join(random.Random(i).choices('abcdefghijklmnop', k=6))
+              for i in range(2000)]
+
+
+def text(rng, words=60):
+    return ' '.join(rng.choice(VOCABULARY) for _ in range(words))
+
+
+def distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+def entry(entry_id, title, summary, url=None):
+    item = dict(id=entry_id, title=title, summary=dict(content=summary))
+    if url:
+        item['alternate'] = [dict(href=url)]
+    return item
+
+
+def test_simhash_keeps_edited_texts_close_and_others_apart():
+    rng = random.Random(0)
+    max_distance = Deduplicator().max_distance
+    close = apart = 0
+    for _ in range(200):
+        words = text(rng).split()
+        edited = list(words)
+        edited[rng.randrange(len(words))] = rng.choice(VOCABULARY)
+        original = simhash(' '.join(words))
+        close += distance(original, simhash(' '.join(edited))) <= max_distance
+        apart += distance(original, simhash(text(rng))) > max_distance
+    # word 3-shingles within 3 bits caught 26 of these
+    assert close >= 180
+    assert apart == 200
+
+
+def test_catches_near_duplicates_with_other_ids():
+    rng = random.Random(1)
+    dedup = Deduplicator()
+    caught = 0
+    for i in range(100):
+        words = text(rng).split()
+        summary = ' '.join(words)
+        words[rng.randrange(len(words))] = 'changed'
+        assert dedup(entry(f'a{i}', 'Title', f'<p>{summary}</p>'))
+        caught += not dedup(entry(f'b{i}', 'Title', ' '.join(words)))
+    assert caught >= 90
+
+
+def test_distinct_entries_pass():
+    rng = random.Random(2)
+    dedup = Deduplicator()
+    assert all(dedup(entry(str(i), 'Title', text(rng))) for i in range(500))
+    assert dedup.duplicates == 0
+
+
+def test_matches_ids_and_canonical_urls():
+    dedup = Deduplicator()
+    assert dedup(entry('1', 't', 's', 'https://www.example.com/a/'))
+    assert not dedup(entry('1', 'other', 'other'))
+    assert not dedup(entry('2', 'other', 'other',
+                           'http://example.com/a?utm_source=x#top'))
+    assert canonical_url('http://WWW.Example.com/a/?b=1&utm_medium=m') \
+        == 'https://example.com/a?b=1'
+
+
+def test_only_the_beginning_of_long_bodies_is_hashed():
+    rng = random.Random(3)
+    dedup = Deduplicator()
+    start = text(rng, 100)
+    long_body = f'<p>{start} {text(rng, 5000)}</p>'
+    started = time.perf_counter()
+    signature = dedup.signature(dict(content=dict(content=long_body)))
+    assert time.perf_counter() - started < 0.01
+    assert signature == dedup.signature(dict(summary=dict(content=start)))
+
+
+def test_evicts_least_recently_seen_entries():
+    dedup = Deduplicator(max_entries=2, near_duplicates=False)
+    for entry_id in ('a', 'b', 'c'):
+        dedup(entry_id)
+    assert len(dedup) == 2
+    assert dedup('a')  # forgotten
+    assert not dedup('c')
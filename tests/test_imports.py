@@ -0,0 +1,21 @@
+import subprocess
+import sys
+
+import feedly_api
+
+
+def test_dir_lists_each_name_once():
+    feedly_api.Auth
+    names = dir(feedly_api)
+    assert names.count('Auth') == 1
+    assert set(feedly_api.__all__) <= set(names)
+
+
+def test_importing_does_not_load_requests():
+    code = ('import sys, feedly_api, feedly_api.models, feedly_api.streams\n'
+            'feedly_api.FeedlyClient, feedly_api.StreamOptions\n'
+            'print(sorted(name for name in ("requests", "urllib3")'
+            ' if name in sys.modules))')
+    output = subprocess.run([sys.executable, '-c', code],
+                            capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == '[]'
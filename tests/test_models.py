@@ -0,0 +1,88 @@
+import json
+from urllib.parse import unquote, urlsplit
+
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+from feedly_api.models import Auth, Feed, FeedlyClient
+
+FEED = 'feed/https://a.example/rss'
+
+
+class RoutingTransport:
+    """Answers each request with the (status code, json) registered for
+    the longest matching path prefix"""
+    def __init__(self, routes):
+        self.headers = CaseInsensitiveDict()
+        self.routes = routes
+        self.paths = []
+
+    def request(self, method, url, **kwargs):
+        path = unquote(urlsplit(url).path)
+        self.paths.append(path)
+        prefix = max((prefix for prefix in self.routes
+                      if path.startswith(prefix)), key=len)
+        status_code, data = self.routes[prefix]
+        response = Response()
+        response.status_code = status_code
+        response._content = json.dumps(data).encode('utf-8')
+        response.url = url
+        return response
+
+    def close(self):
+        pass
+
+
+def client_for(routes):
+    client = FeedlyClient(Auth(access_token='t'), 'h', retries=1,
+                          transport=RoutingTransport(routes))
+    client.circuit_breakers = None
+    return client
+
+
+def collections(label):
+    return [dict(id='user/u/category/c', label=label,
+                 feeds=[dict(id=FEED, title='A')])]
+
+
+def test_reloading_refreshes_objects_in_place():
+    client = client_for({'/v3/collections': (200, collections('Old'))})
+    collection, = client.get_collections()
+    feed, = collection.feeds
+    client.session.routes['/v3/collections'] = (200, collections('New'))
+    again, = client.get_collections()
+    assert again is collection
+    assert collection.label == 'New'
+    assert again.feeds[0] is feed
+
+
+def test_missing_fields_are_loaded_once():
+    client = client_for({
+        '/v3/collections': (200, collections('C')),
+        '/v3/feeds/': (200, dict(id=FEED, title='A', subscribers=12))})
+    feed = client.get_collections()[0].feeds[0]
+    assert feed.title == 'A'
+    assert client.session.paths == ['/v3/collections']
+    assert feed.subscribers == 12
+    assert feed.website is None  # not in the full details either
+    assert client.session.paths == ['/v3/collections', f'/v3/feeds/{FEED}']
+    assert feed.loaded
+
+
+def test_failed_load_is_not_retried_on_every_read():
+    client = client_for({
+        '/v3/collections': (200, collections('C')),
+        '/v3/feeds/': (404, dict(errorMessage='not found'))})
+    feed = client.get_collections()[0].feeds[0]
+    assert feed.website is None
+    assert feed.subscribers is None
+    assert client.session.paths.count(f'/v3/feeds/{FEED}') == 1
+    assert feed.load_error is not None and not feed.loaded
+
+    feed.retry_delay = 0
+    client.session.routes['/v3/feeds/'] = (200, dict(id=FEED,
+                                                     website='https://a'))
+    assert feed.velocity is None  # retried, once due
+    assert feed.website == 'https://a'
+    assert feed.loaded and feed.load_error is None
+    assert isinstance(feed, Feed)
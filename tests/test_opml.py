@@ -0,0 +1,76 @@
+import io
+
+from fakes import FakeCollectionsClient
+from feedly_api.opml import export_opml, import_opml
+
+NESTED = b'''<?xml version="1.0" encoding="UTF-8"?>
+<opml version="2.0">
+  <head><title>Subscriptions</title></head>
+  <body>
+    <outline text="Loose" xmlUrl="https://loose.example/rss"/>
+    <outline text="Tech">
+      <outline text="AI">
+        <outline title="AI 1" xmlUrl="https://ai1.example/rss"/>
+        <outline text="AI 2" xmlUrl="https://ai2.example/rss"/>
+      </outline>
+      <outline text="Tech 1" xmlUrl="feed/https://tech1.example/rss"/>
+    </outline>
+  </body>
+</opml>
+'''
+
+
+def feed_ids(client, label):
+    collection = next(collection for collection in client.collections
+                      if collection.label == label)
+    return [feed['id'] for feed in collection['feeds']]
+
+
+def test_nested_outlines_go_to_their_innermost_category():
+    client = FakeCollectionsClient()
+    added = import_opml(client, io.BytesIO(NESTED), default_label='Misc')
+    assert added == {'Misc': 1, 'AI': 2, 'Tech': 1}
+    assert feed_ids(client, 'AI') == ['feed/https://ai1.example/rss',
+                                      'feed/https://ai2.example/rss']
+    assert feed_ids(client, 'Tech') == ['feed/https://tech1.example/rss']
+    assert feed_ids(client, 'Misc') == ['feed/https://loose.example/rss']
+    ai = next(collection for collection in client.collections
+              if collection.label == 'AI')
+    assert ai['feeds'][0]['title'] == 'AI 1'
+
+
+def test_existing_collections_get_feeds_in_batches():
+    client = FakeCollectionsClient([dict(id='user/u/category/news',
+                                         label='News', feeds=[])])
+    outlines = ''.join(f'<outline text="{i}" xmlUrl="https://{i}.example"/>'
+                       for i in range(5))
+    source = (f'<opml><body><outline text="News">{outlines}</outline>'
+              f'<outline text="New">{outlines}</outline></body></opml>')
+    import_opml(client, io.BytesIO(source.encode('utf-8')), batch_size=2)
+    news = 'user/u/category/news'
+    new = 'user/u/category/New'
+    assert client.calls == [('mput', news, 2), ('mput', news, 2),
+                            ('mput', news, 1),
+                            # the first batch creates the collection
+                            ('create', new, 2), ('mput', new, 2),
+                            ('mput', new, 1)]
+    assert len(feed_ids(client, 'New')) == 5
+
+
+def test_export_then_import_round_trips():
+    source = FakeCollectionsClient([
+        dict(id='user/u/category/a', label='A & B',
+             feeds=[dict(id='feed/https://a.example/rss', title='A',
+                         website='https://a.example'),
+                    dict(id='feed/https://b.example/rss', title='<B>')]),
+        dict(id='user/u/category/c', label='C', feeds=[])])
+    document = io.BytesIO()
+    assert export_opml(source, document) == 2
+
+    target = FakeCollectionsClient()
+    document.seek(0)
+    assert import_opml(target, document) == {'A & B': 2}
+    assert target.collections[0]['feeds'] == [
+        dict(id='feed/https://a.example/rss', title='A'),
+        dict(id='feed/https://b.example/rss', title='<B>')]
+    assert b'htmlUrl="https://a.example"' in document.getvalue()
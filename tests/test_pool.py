@@ -0,0 +1,88 @@
+import pytest
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+from feedly_api.exceptions import (NotFoundError, PoolExhaustedError,
+                                   RateLimitError)
+from feedly_api.models import Auth, FeedlyClient
+from feedly_api.pool import FeedlyClientPool
+from feedly_api.streams import StreamOptions
+
+
+class FakeTransport:
+    def __init__(self, status_code=200):
+        self.headers = CaseInsensitiveDict()
+        self.status_code = status_code
+        self.requests = 0
+
+    def request(self, method, url, **kwargs):
+        self.requests += 1
+        response = Response()
+        response.status_code = self.status_code
+        if self.status_code == 429:
+            response.headers['Retry-After'] = '60'
+        response._content = b'{"items": []}'
+        response.url = url
+        return response
+
+    def close(self):
+        pass
+
+
+def pool_of(*status_codes, **settings):
+    clients = [FeedlyClient(Auth(access_token='t'), 'h', retries=1,
+                            transport=FakeTransport(status_code))
+               for status_code in status_codes]
+    for client in clients:
+        client.circuit_breakers = None
+    return FeedlyClientPool(clients, **settings)
+
+
+def read(pool, stream_id='feed/a'):
+    return pool.get_stream_contents(stream_id, 'contents', StreamOptions())
+
+
+def test_choosing_counts_the_request_in_flight():
+    pool = pool_of(200, 200)
+    first = pool._acquire()
+    second = pool._acquire()
+    assert first is not second
+    assert first.in_flight == second.in_flight == 1
+    pool._release(first)
+    pool._release(second)
+    assert first.in_flight == second.in_flight == 0
+
+
+def test_pins_stream_to_first_account_that_reads_it():
+    pool = pool_of(404, 200)
+    read(pool)
+    read(pool)
+    denied, reader = pool.accounts
+    assert pool.pins['feed/a'] is reader
+    assert denied.client.session.requests == 1
+    assert reader.client.session.requests == 2
+
+
+def test_denied_stream_raises_http_error_when_others_are_rate_limited():
+    pool = pool_of(404, 429)
+    with pytest.raises(NotFoundError):
+        read(pool)
+    # the denial is remembered; the other account is still limited
+    with pytest.raises(NotFoundError):
+        read(pool)
+
+
+def test_rate_limited_everywhere_raises_rate_limit_error():
+    pool = pool_of(429, 429)
+    with pytest.raises(RateLimitError):
+        read(pool)
+    with pytest.raises(PoolExhaustedError):
+        read(pool)
+
+
+def test_stream_state_is_bounded():
+    pool = pool_of(404, 200, max_streams=2)
+    for stream_id in ('feed/a', 'feed/b', 'feed/c'):
+        read(pool, stream_id)
+    assert list(pool.pins) == ['feed/b', 'feed/c']
+    assert list(pool._denied) == ['feed/b', 'feed/c']
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from fakes import FakeClient
+from feedly_api.models import ContentStream
+from feedly_api.profiling import Profiler
+from feedly_api.streams import StreamOptions
+
+
+@pytest.mark.parametrize('prefetch', [0, 1])
+def test_records_every_phase_of_every_page(prefetch):
+    client = FakeClient(total=25)
+    client.profiler = Profiler()
+    stream = ContentStream(client, 'user/u/category/c',
+                           StreamOptions(count=10, max_count=100,
+                                         prefetch=prefetch))
+    assert len(list(stream)) == 25
+
+    phases = client.profiler.summary()['user/u/category/c']
+    assert phases['request']['count'] == 3
+    assert phases['decode']['count'] == 3
+    assert phases['buffer']['count'] == 3
+    for phase in phases.values():
+        assert phase['max'] <= phase['total']
+        assert phase['mean'] == pytest.approx(phase['total']
+                                              / phase['count'])
+    request = next(span for span in client.profiler.spans
+                   if span.phase == 'request')
+    assert request.args['bytes'] > 0
+    assert set(Profiler.phases) >= set(phases)
+
+
+def test_formats_summary_in_phase_order():
+    profiler = Profiler()
+    profiler.record('decode', 's', 0.0, 0.5, items=2)
+    profiler.record('request', 's', 0.0, 1.0)
+    profiler.record('request', 's', 1.0, 3.0)
+    lines = profiler.format_summary().splitlines()
+    assert lines[0] == 's'
+    assert lines[1].split() == ['request', '2', 'pages', '4.0000s', 'total',
+                                '2.0000s', 'mean', '3.0000s', 'max']
+    assert lines[2].split()[:2] == ['decode', '1']
+
+
+def test_chrome_trace_events(tmp_path):
+    profiler = Profiler()
+    with profiler.span('consumer', 's', items=3):
+        pass
+    path = tmp_path / 'trace.json'
+    profiler.dump_chrome_trace(str(path))
+    trace = json.loads(path.read_text())
+    metadata, event = trace['traceEvents']
+    assert metadata['ph'] == 'M' and metadata['name'] == 'thread_name'
+    assert event['ph'] == 'X'
+    assert (event['name'], event['cat']) == ('consumer', 's')
+    assert event['tid'] == metadata['tid']
+    assert event['ts'] >= 0 and event['dur'] >= 0
+    assert event['args'] == dict(items=3, stream='s')
+
@@ -0,0 +1,46 @@
+from fakes import FakeClient
+from feedly_api.models import ContentStream
+from feedly_api.streams import Projection, StreamOptions
+
+ITEM = dict(id='e1',
+            title='Title',
+            summary=dict(content='<p>Caf&eacute; <b>news</b></p>'
+                                 '<script>track()</script>',
+                         direction='ltr'),
+            content=dict(content='<div>' + 'word ' * 100 + '</div>'),
+            published=1)
+
+
+def test_keeps_only_listed_fields():
+    assert Projection(['id', 'published', 'missing'])(ITEM) \
+        == dict(id='e1', published=1)
+    assert Projection()(ITEM) == ITEM
+
+
+def test_strips_html_of_bodies():
+    item = Projection(strip_html=True)(dict(ITEM))
+    assert item['summary'] == dict(content='Café news', direction='ltr')
+    assert item['content']['content'] == ('word ' * 100).strip()
+    assert ITEM['summary']['content'].startswith('<p>')  # not modified
+
+
+def test_truncates_bodies():
+    item = Projection(['summary', 'content'], max_length=9)(ITEM)
+    assert item['summary']['content'] == '<p>Caf&ea'
+    assert item['content']['content'] == '<div>word'
+    assert Projection(strip_html=True, max_length=4)(ITEM)[
+        'summary']['content'] == 'Café'
+
+
+def test_leaves_ids_and_empty_bodies_alone():
+    assert Projection(['id'], strip_html=True)('e1') == 'e1'
+    assert Projection(strip_html=True)(dict(summary={})) == dict(summary={})
+
+
+def test_stream_items_are_projected_after_filters():
+    client = FakeClient(total=20)
+    stream = ContentStream(client, 'user/u/category/c',
+                           StreamOptions(count=5, max_count=20,
+                                         projection=Projection(['id'])))
+    stream.add_filter(lambda item: item['crawled'] % 2 == 0)
+    assert list(stream) == [dict(id=str(i)) for i in range(0, 20, 2)]
@@ -0,0 +1,85 @@
+import pytest
+
+from feedly_api.seen import ScalableBloomFilter, SeenSet
+
+
+def test_added_keys_are_contained():
+    bloom = ScalableBloomFilter(initial_capacity=100)
+    assert bloom.add('a')
+    assert not bloom.add('a')
+    assert 'a' in bloom
+    assert b'a' in bloom  # str keys are hashed as utf-8
+    assert 'b' not in bloom
+    assert len(bloom) == 1
+
+
+def test_grows_slices_and_keeps_error_rate():
+    bloom = ScalableBloomFilter(initial_capacity=1000, error_rate=0.01)
+    keys = [f'entry/{i}' for i in range(20000)]
+    for key in keys:
+        bloom.add(key)
+    assert len(bloom.slices) == 5  # 1000 + 2000 + 4000 + 8000 + 16000
+    assert all(key in bloom for key in keys)
+    false_positives = sum(f'other/{i}' in bloom for i in range(20000))
+    assert false_positives < 200
+
+
+def test_persists_between_runs(tmp_path):
+    path = str(tmp_path / 'seen.bloom')
+    with ScalableBloomFilter(path, initial_capacity=10) as bloom:
+        for i in range(25):
+            bloom.add(str(i))
+        slices = len(bloom.slices)
+    # the file keeps the parameters it was created with
+    with ScalableBloomFilter(path, initial_capacity=999,
+                             error_rate=0.1) as bloom:
+        assert (bloom.initial_capacity, bloom.error_rate) == (10, 0.001)
+        assert len(bloom.slices) == slices
+        assert len(bloom) == 25
+        assert all(str(i) in bloom for i in range(25))
+        bloom.add('25')
+    with ScalableBloomFilter(path) as bloom:
+        assert '25' in bloom
+        assert len(bloom) == 26
+
+
+def test_empty_file_starts_a_new_filter(tmp_path):
+    path = tmp_path / 'seen.bloom'
+    path.write_bytes(b'')
+    with ScalableBloomFilter(str(path)) as bloom:
+        bloom.add('a')
+    with ScalableBloomFilter(str(path)) as bloom:
+        assert 'a' in bloom
+
+
+@pytest.mark.parametrize('content', [b'short', b'not a seen-set file' * 10])
+def test_rejects_foreign_files(tmp_path, content):
+    path = tmp_path / 'other'
+    path.write_bytes(content)
+    with pytest.raises(ValueError):
+        ScalableBloomFilter(str(path))
+    assert path.read_bytes() == content
+
+
+def test_rejects_truncated_files(tmp_path):
+    path = tmp_path / 'seen.bloom'
+    with ScalableBloomFilter(str(path), initial_capacity=1000) as bloom:
+        bloom.add('a')
+    path.write_bytes(path.read_bytes()[:100])
+    with pytest.raises(ValueError):
+        ScalableBloomFilter(str(path))
+
+
+def test_seen_set_filters_items_once():
+    seen = SeenSet(initial_capacity=100)
+    items = [dict(id='a'), dict(id='b'), dict(id='a')]
+    assert [item['id'] for item in items if seen(item)] == ['a', 'b']
+    assert dict(id='b') in seen
+    assert len(seen) == 2
+
+
+def test_seen_set_without_mark_only_checks():
+    seen = SeenSet(initial_capacity=100, mark=False)
+    seen.add('a')
+    assert [item for item in ['a', 'b', 'b'] if seen(item)] == ['b', 'b']
+    assert len(seen) == 1
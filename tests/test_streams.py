@@ -0,0 +1,151 @@
+import threading
+import time
+
+import pytest
+
+from fakes import FakeClient
+from feedly_api.models import ContentStream, MixStream
+from feedly_api.streams import MixOptions, StreamBuffer, StreamOptions
+
+
+def ids(items):
+    return [int(item['id']) for item in items]
+
+
+@pytest.mark.parametrize('prefetch', [0, 2])
+def test_iterates_every_item_in_order(prefetch):
+    client = FakeClient(total=45)
+    stream = ContentStream(client, 'user/u/category/c',
+                           StreamOptions(count=10, max_count=100,
+                                         prefetch=prefetch))
+    assert ids(stream) == list(range(45))
+    assert stream.exhausted
+
+
+@pytest.mark.parametrize('prefetch', [0, 1, 3])
+def test_resumes_after_break(prefetch):
+    client = FakeClient(total=60)
+    stream = ContentStream(client, 'user/u/category/c',
+                           StreamOptions(count=10, max_count=100,
+                                         prefetch=prefetch))
+    first = []
+    for item in stream:
+        first.append(item)
+        if len(first) == 15:
+            break
+    rest = list(stream)
+    assert ids(first + rest) == list(range(60))
+
+
+def test_break_does_not_wait_for_request_in_flight():
+    client = FakeClient(total=30, delay=0.5)
+    stream = ContentStream(client, 'user/u/category/c',
+                           StreamOptions(count=10, max_count=100,
+                                         prefetch=1))
+    iterator = iter(stream)
+    next(iterator)
+    started = time.monotonic()
+    iterator.close()
+    assert time.monotonic() - started < 0.25
+    # the page fetched in the background is kept for the next iteration
+    assert ids(stream) == list(range(1, 30))
+
+
+def test_prefetch_waits_for_room_in_buffer():
+    client = FakeClient(total=100)
+    stream = ContentStream(client, 'user/u/category/c',
+                           StreamOptions(count=10, max_count=100,
+                                         prefetch=2))
+    iterator = iter(stream)
+    next(iterator)
+    time.sleep(0.1)
+    # the page being consumed plus two pages fetched ahead
+    assert len(client.requests) == 3
+    iterator.close()
+
+
+def test_max_buffered_bytes_shrinks_pages_without_prefetch():
+    client = FakeClient(total=100, item_size=1000)
+    stream = ContentStream(client, 'user/u/category/c',
+                           StreamOptions(count=50, max_count=100,
+                                         max_buffered_bytes=5000))
+    assert ids(stream) == list(range(100))
+    first, *later = [count for _, count in client.requests]
+    assert first == 50  # item size unknown until a page arrives
+    assert later and all(count <= 5 for count in later)
+
+
+def test_mix_is_one_page_of_count_items():
+    client = FakeClient(total=100, item_size=1000)
+    options = MixOptions(count=10, max_buffered_items=3,
+                         max_buffered_bytes=2000).replace(count=30)
+    assert options.max_count == 30
+    assert ids(MixStream(client, 'feed/f', options)) == list(range(30))
+    assert client.requests == [(0, 30)]
+
+
+def test_stream_buffer_hands_pages_to_consumer():
+    buffer = StreamBuffer(max_pages=1)
+    received = []
+
+    def consume():
+        page = buffer.get()
+        while page is not None:
+            received.append(page[0])
+            buffer.release(len(page[0]), page[1])
+            page = buffer.get()
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    for page in range(5):
+        assert buffer.wait_for_space()
+        buffer.put([page], 1)
+    buffer.finish()
+    consumer.join(1)
+    assert received == [[0], [1], [2], [3], [4]]
+
+
+def test_stream_buffer_passes_producer_error_to_consumer():
+    buffer = StreamBuffer()
+    buffer.finish(ValueError('boom'))
+    with pytest.raises(ValueError):
+        buffer.get()
+
+
+def test_stream_buffer_close_releases_waiting_producer():
+    buffer = StreamBuffer(max_pages=1)
+    buffer.put([1], 1)
+    threading.Timer(0.05, buffer.close).start()
+    assert buffer.wait_for_space() is False
+
+
+@pytest.mark.parametrize('prefetch', [0, 2])
+def test_partial_result_resumes_without_losing_items(prefetch):
+    client = FakeClient(total=60, delay=0.1)
+    options = StreamOptions(count=10, max_count=100, prefetch=prefetch)
+    result = ContentStream(client, 'user/u/category/c',
+                           options).collect(0.25)
+    assert not result.complete
+    assert result.continuation is not None
+    rest = ContentStream(client, 'user/u/category/c',
+                         options.replace(continuation=result.continuation))
+    assert ids(result) + ids(rest) == list(range(60))
+
+
+@pytest.mark.parametrize('prefetch', [0, 2])
+def test_collect_deadline_applies_to_that_call_only(prefetch):
+    client = FakeClient(total=60, delay=0.1)
+    stream = ContentStream(client, 'user/u/category/c',
+                           StreamOptions(count=10, max_count=100,
+                                         prefetch=prefetch))
+    partial = stream.collect(0.15)
+    assert not partial.complete
+    rest = stream.collect()
+    assert rest.complete
+    assert ids(partial) + ids(rest) == list(range(60))
+
+
+def test_mix_max_count_cannot_be_set_apart_from_count():
+    with pytest.raises(AttributeError):
+        MixOptions().replace(max_count=5)
+    assert MixOptions(count=5).replace(count=8).max_count == 8
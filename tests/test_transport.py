@@ -0,0 +1,55 @@
+import base64
+import json
+
+from feedly_api.models import Auth, FeedlyClient
+from feedly_api.transport import ReplayTransport, interaction_key
+
+
+def write_cassette(path, url, headers, body=b'{}', wire_bytes=None):
+    interaction = dict(key=interaction_key('GET', url),
+                       status_code=200,
+                       reason='OK',
+                       url=url,
+                       headers=headers,
+                       encoding='utf-8',
+                       body=base64.b64encode(body).decode('ascii'),
+                       elapsed=0.0,
+                       wire_bytes=wire_bytes or len(body))
+    path.write_text(json.dumps(interaction) + '\n')
+
+
+def test_replay_drops_coding_headers_case_insensitively(tmp_path):
+    cassette = tmp_path / 'cassette.jsonl'
+    write_cassette(cassette, 'https://h/v3/profile',
+                   {'content-encoding': 'gzip', 'Content-Length': '9',
+                    'X-Custom': '1'})
+    client = FeedlyClient(Auth(access_token='t'), 'h',
+                          transport=ReplayTransport(str(cassette)))
+    response = client.get('/v3/profile')
+    assert dict(response.headers) == {'X-Custom': '1'}
+    assert response.json() == {}
+
+
+def test_replay_reports_the_recorded_transfer(tmp_path):
+    cassette = tmp_path / 'cassette.jsonl'
+    body = b'{"items": [' + b','.join([b'{}'] * 500) + b']}'
+    write_cassette(cassette, 'https://h/v3/profile',
+                   {'Content-Encoding': 'gzip'}, body, wire_bytes=40)
+    client = FeedlyClient(Auth(access_token='t'), 'h',
+                          transport=ReplayTransport(str(cassette)))
+    client.get('/v3/profile')
+    record = client.transfer_stats.last
+    assert record.content_encoding == 'gzip'
+    assert (record.compressed_bytes, record.decompressed_bytes) \
+        == (40, len(body))
+
+
+def test_replayed_responses_can_be_streamed(tmp_path):
+    cassette = tmp_path / 'cassette.jsonl'
+    body = b'{"x": "' + b'x' * 200000 + b'"}'
+    write_cassette(cassette, 'https://h/v3/profile', {}, body)
+    client = FeedlyClient(Auth(access_token='t'), 'h',
+                          transport=ReplayTransport(str(cassette)))
+    response = client.get('/v3/profile', stream=True)
+    assert b''.join(client.iter_content(response)) == body
+    assert client.transfer_stats.last.decompressed_bytes == len(body)
@@ -0,0 +1,41 @@
+import io
+import os
+
+import pytest
+
+from feedly_api.utils import MultipartFile
+
+
+class Pipe(io.RawIOBase):
+    """A readable, non-seekable stream returning short reads"""
+    def __init__(self, data):
+        self.data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        chunk = self.data.read(min(len(buffer), 7))
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+
+def test_seekable_upload_has_length_and_rewinds():
+    data = os.urandom(1000)
+    body = MultipartFile(io.BytesIO(data))
+    expected = body.head + data + body.tail
+    assert len(body) == len(expected)
+    assert body.read() == expected
+    body.seek(0)
+    assert b''.join(body) == expected
+
+
+def test_non_seekable_upload_is_streamed_without_length():
+    data = os.urandom(1000)
+    body = MultipartFile(Pipe(data))
+    assert not body.seekable
+    with pytest.raises(TypeError):
+        len(body)
+    assert b''.join(body) == body.head + data + body.tail
+    with pytest.raises(io.UnsupportedOperation):
+        body.seek(0)
@@ -0,0 +1,53 @@
+import time
+
+from fakes import FakeClient
+from feedly_api.streams import StreamOptions
+from feedly_api.watch import StreamWatcher
+
+
+def test_poll_capped_by_max_count_loses_no_entries():
+    client = FakeClient(total=150, crawled=1000)
+    emitted = []
+    watcher = StreamWatcher(client,
+                            callback=lambda _, items: emitted.extend(items))
+    watched = watcher.watch('user/u/category/c', since=0)
+    watcher._poll_once(watched)
+    assert len(emitted) == 100
+    assert watched.newer_than == 0  # window not drained yet
+    watcher._poll_once(watched)
+    assert sorted(int(item['id']) for item in emitted) == list(range(150))
+    assert watched.continuation is None
+    assert watched.newer_than > 0
+
+
+def test_overlapping_polls_drop_repeats():
+    client = FakeClient(total=30)
+    emitted = []
+    watcher = StreamWatcher(client,
+                            callback=lambda _, items: emitted.extend(items))
+    watched = watcher.watch('user/u/category/c',
+                            options=StreamOptions(count=10),
+                            since=0)
+    watcher._poll_once(watched)
+    client.total = 35
+    watched.newer_than = None  # everything again, as a long overlap would
+    watcher._poll_once(watched)
+    assert sorted(int(item['id']) for item in emitted) == list(range(35))
+
+
+def test_failing_callback_does_not_stop_the_watcher():
+    client = FakeClient(total=5)
+
+    def callback(stream_id, items):
+        raise ValueError('boom')
+
+    watcher = StreamWatcher(client, callback=callback,
+                            min_interval=0.01, max_interval=0.02,
+                            spacing=0)
+    watcher.watch('user/u/category/c', since=0)
+    with watcher:
+        deadline = time.monotonic() + 2
+        while len(client.requests) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert watcher._thread.is_alive()
+    assert len(client.requests) >= 3